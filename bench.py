@@ -0,0 +1,345 @@
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from importlib import import_module
+from time import perf_counter
+
+# Benchmarks of the referee engines: turns per second, copies per second and
+# the time spent in each phase of World.update, over fixed sets of scenarios.
+#
+#   python bench.py                          # referee and referee_opti, printed
+#   python bench.py referee_opti --json out.json
+#   python bench.py --compare HEAD~3 .       # two git revisions (or json files),
+#                                            # '.' is the working tree
+#
+# An engine is a module with get_world() reading the game input, a World
+# with copy / prepare / set_actions / update and an Action class, like
+# referee.py. Scenarios are kept in the game input format, so that every
+# engine (and every revision) plays exactly the same turns.
+
+ENGINES = ('referee', 'referee_opti')
+SETS = ('input_ex', 'random', 'stress', 'endgame')
+PHASES = ('move_cannonbals', 'decrement_rhum', 'update_initial_rum', 'apply_actions', 'move_ships',
+          'rotate_ships', 'explode_ships', 'explode_mines', 'explode_barrels')
+ACTIONS = ('WAIT', 'FASTER', 'SLOWER', 'GAUCHE', 'DROITE', 'FIRE', 'MINE')
+METRICS = ('turns_per_s', 'copies_per_s')
+
+TURNS = 50
+COPIES = 200
+REPEAT = 5
+THRESHOLD = 0.05
+HERE = os.path.dirname(os.path.abspath(__file__))  # git runs there, not in the current directory
+
+
+# scenarios
+
+def world_lines(world):
+    # a referee_opti World in the game input format
+    from topology import CELL_X, CELL_Y
+
+    lines = []
+    for owner, ships in ((1, world.my_ships), (0, world.enemy_ships)):
+        for ship in ships:
+            lines.append('SHIP {} {} {} {} {} {}'.format(CELL_X[ship.pos], CELL_Y[ship.pos], ship.ori, ship.speed,
+                                                         ship.health, owner))
+    for barrel in world.barrels:
+        lines.append('BARREL {} {} {} 0 0 0'.format(CELL_X[barrel.pos], CELL_Y[barrel.pos], barrel.health))
+    for mine in world.mines:
+        lines.append('MINE {} {} 0 0 0 0'.format(CELL_X[mine.pos], CELL_Y[mine.pos]))
+    for ball in world.cannon_balls:
+        lines.append('CANNONBALL {} {} 0 {} 0 0'.format(CELL_X[ball.pos], CELL_Y[ball.pos], ball.remaining_turns))
+
+    return [str(len(world.my_ships)), str(len(lines))] + ['{} {}'.format(i, line) for i, line in enumerate(lines)]
+
+
+def random_actions(rng, turns):
+    # actions[t][side][i], for up to 3 ships per side
+    actions = []
+    for _ in range(turns):
+        turn = []
+        for side in (0, 1):
+            ships = []
+            for i in range(3):
+                action = rng.choice(ACTIONS)
+                if action == 'FIRE':
+                    ships.append([action, rng.randrange(23), rng.randrange(21)])
+                else:
+                    ships.append([action])
+            turn.append(ships)
+        actions.append(turn)
+    return actions
+
+
+def make_scenarios(seed=0, turns=TURNS, corpus=None):
+    # {set: [{'lines': game input, 'actions': actions}]}, needs referee_opti.
+    # The random set is taken from a scenarios.py corpus file when one is given.
+    import referee_opti
+    from scenarios import random_world
+
+    rng = random.Random(seed)
+    sets = {}
+
+    with open(os.path.join(HERE, 'input_ex.txt')) as f:
+        sets['input_ex'] = [f.read().split('\n')]
+
+    if corpus is not None:
+        from replay import Replay
+        corpus = Replay(corpus)
+        sets['random'] = [world_lines(corpus.world(i)) for i in range(min(len(corpus), 50))]
+    else:
+        random.seed(seed)
+        sets['random'] = [world_lines(referee_opti.get_random_world()) for _ in range(50)]
+    sets['stress'] = [world_lines(random_world(rng, ships=(3, 3), barrels=26, mines=60, balls=30))
+                      for _ in range(10)]
+    sets['endgame'] = [world_lines(random_world(rng, ships=(1, rng.randrange(1, 3)), barrels=rng.randrange(4),
+                                                mines=rng.randrange(6), balls=0, health=(1, 30)))
+                       for _ in range(20)]
+
+    return {name: [{'lines': lines, 'actions': random_actions(rng, turns)} for lines in scenarios]
+            for name, scenarios in sets.items()}
+
+
+# engines
+
+class Engine:
+    def __init__(self, name):
+        self.name = name
+        self.module = import_module(name)
+        self.World = self.module.World
+        self.actions = {a: getattr(self.module.Action, a) for a in ACTIONS}
+        if hasattr(self.module, 'cell_of'):
+            self.target = self.module.cell_of
+        else:
+            self.target = self.module.Coord
+
+    def world(self, lines):
+        stdin = sys.stdin
+        sys.stdin = io.StringIO('\n'.join(lines) + '\n')
+        try:
+            return self.module.get_world()
+        finally:
+            sys.stdin = stdin
+
+    def turn_actions(self, actions):
+        return [[(self.actions[a[0]], self.target(a[1], a[2]) if len(a) == 3 else None) for a in side]
+                for side in actions]
+
+    def play(self, world, actions):
+        # plays the turns on world until the game is over, returns the time and the number of turns
+        turns = 0
+        start = perf_counter()
+        for mine, enemy in actions:
+            world.prepare()
+            world.set_actions(1, mine[:len(world.my_ships)])
+            world.set_actions(0, enemy[:len(world.enemy_ships)])
+            turns += 1
+            try:
+                if world.update():
+                    break
+            except InterruptedError:  # referee.py ends the game this way
+                break
+        return perf_counter() - start, turns
+
+
+def bench_set(engine, scenarios, repeat=REPEAT, copies=COPIES):
+    worlds = [engine.world(s['lines']) for s in scenarios]
+    actions = [[engine.turn_actions(turn) for turn in s['actions']] for s in scenarios]
+
+    best_turns = None
+    best_copies = None
+    for _ in range(repeat):
+        elapsed = 0
+        turns = 0
+        for world, acts in zip(worlds, actions):
+            t, n = engine.play(world.copy(), acts)
+            elapsed += t
+            turns += n
+        if best_turns is None or turns / elapsed > best_turns:
+            best_turns = turns / elapsed
+
+        start = perf_counter()
+        for world in worlds:
+            for _ in range(copies):
+                world.copy()
+        rate = copies * len(worlds) / (perf_counter() - start)
+        if best_copies is None or rate > best_copies:
+            best_copies = rate
+
+    return {
+        'turns_per_s': best_turns,
+        'copies_per_s': best_copies,
+        'phases': phases(engine, worlds, actions),
+    }
+
+
+def phases(engine, worlds, actions):
+    # microseconds per turn in each phase, measured in a separate pass since
+    # the wrappers slow everything down a bit. 'update' is what is left of it.
+    World = engine.World
+    names = ['prepare', 'set_actions', 'update'] + [p for p in PHASES if hasattr(World, p)]
+    spent = dict.fromkeys(names, 0)
+    originals = {name: World.__dict__[name] for name in names}
+
+    def timed(name, method):
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                spent[name] += perf_counter() - start
+        return wrapper
+
+    for name, method in originals.items():
+        setattr(World, name, timed(name, method))
+    try:
+        turns = sum(engine.play(world.copy(), acts)[1] for world, acts in zip(worlds, actions))
+    finally:
+        for name, method in originals.items():
+            setattr(World, name, method)
+
+    spent['update'] -= sum(spent[p] for p in PHASES if p in spent)
+    return {name: 1e6 * t / turns for name, t in spent.items()}
+
+
+def run(engines=ENGINES, sets=SETS, scenarios=None, repeat=REPEAT):
+    scenarios = scenarios or make_scenarios()
+    results = {}
+    for name in engines:
+        try:
+            engine = Engine(name)
+        except Exception as e:
+            results[name] = {'error': repr(e)}
+            continue
+        results[name] = {s: bench_set(engine, scenarios[s], repeat) for s in sets}
+    return {'revision': revision(), 'python': sys.version.split()[0], 'results': results}
+
+
+def revision():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], stderr=subprocess.DEVNULL,
+                                       universal_newlines=True, cwd=HERE).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(data):
+    lines = ['revision {}, python {}'.format(data['revision'], data['python'])]
+    for engine, sets in data['results'].items():
+        if 'error' in sets:
+            lines.append('{}: {}'.format(engine, sets['error']))
+            continue
+        for name, r in sets.items():
+            lines.append('{:<14} {:<9} {:>10.0f} turns/s {:>10.0f} copies/s'.format(
+                engine, name, r['turns_per_s'], r['copies_per_s']))
+            total = sum(r['phases'].values())
+            lines.append('    ' + '  '.join('{} {:.1f}us {:.0%}'.format(p, t, t / total)
+                                            for p, t in r['phases'].items() if t))
+    return '\n'.join(lines)
+
+
+# comparison
+
+def measure(ref, engines, sets, scenarios, repeat):
+    # results of a json file, of the working tree ('.') or of a git revision
+    if os.path.isfile(ref):
+        with open(ref) as f:
+            return json.load(f)
+    if ref == '.':
+        return run(engines, sets, scenarios, repeat)
+
+    tree = tempfile.mkdtemp(prefix='bench-')
+    try:
+        archive = subprocess.Popen(['git', 'archive', ref], stdout=subprocess.PIPE, cwd=HERE)
+        subprocess.check_call(['tar', '-x', '-C', tree], stdin=archive.stdout)
+        if archive.wait():
+            raise ValueError('unknown revision: ' + ref)
+        shutil.copy(os.path.abspath(__file__), tree)
+        with open(os.path.join(tree, 'scenarios.json'), 'w') as f:
+            json.dump(scenarios, f)
+
+        out = os.path.join(tree, 'bench.json')
+        subprocess.check_call([sys.executable, 'bench.py', '--scenarios', 'scenarios.json', '--json', out,
+                               '--repeat', str(repeat), '--sets'] + list(sets) + ['--'] + list(engines), cwd=tree,
+                              stdout=subprocess.DEVNULL)
+        with open(out) as f:
+            data = json.load(f)
+        data['revision'] = ref
+        return data
+    finally:
+        shutil.rmtree(tree)
+
+
+def compare(old, new, threshold=THRESHOLD):
+    # (report, regressions): every metric that got slower by more than threshold
+    lines = ['{} -> {}'.format(old['revision'], new['revision'])]
+    regressions = []
+    for engine, sets in new['results'].items():
+        before = old['results'].get(engine, {})
+        if 'error' in sets or 'error' in before or not before:
+            lines.append('{}: not in both'.format(engine))
+            continue
+        for name, r in sets.items():
+            if name not in before:
+                continue
+            for metric in METRICS:
+                ratio = r[metric] / before[name][metric]
+                flag = ''
+                if ratio < 1 - threshold:
+                    flag = '  REGRESSION'
+                    regressions.append((engine, name, metric, ratio))
+                lines.append('{:<14} {:<9} {:<13} {:>10.0f} -> {:>10.0f} {:>+7.1%}{}'.format(
+                    engine, name, metric, before[name][metric], r[metric], ratio - 1, flag))
+    return '\n'.join(lines), regressions
+
+
+def main(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the referee engines.')
+    parser.add_argument('engines', nargs='*', default=ENGINES, help="engine modules")
+    parser.add_argument('--sets', nargs='+', default=SETS, choices=SETS)
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="best of this many runs")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="write the results there")
+    parser.add_argument('--scenarios', help="json scenarios (see --dump-scenarios) instead of generating them")
+    parser.add_argument('--corpus', help="take the random worlds from this scenarios.py corpus")
+    parser.add_argument('--dump-scenarios', help="write the generated scenarios there and exit")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help="git revisions, '.' for the working tree, or json results")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="slowdown flagged as a regression")
+    args = parser.parse_args(argv)
+
+    if args.scenarios:
+        with open(args.scenarios) as f:
+            scenarios = json.load(f)
+    else:
+        scenarios = make_scenarios(args.seed, corpus=args.corpus)
+
+    if args.dump_scenarios:
+        with open(args.dump_scenarios, 'w') as f:
+            json.dump(scenarios, f)
+        return
+
+    if args.compare:
+        old, new = (measure(ref, args.engines, args.sets, scenarios, args.repeat) for ref in args.compare)
+        text, regressions = compare(old, new, args.threshold)
+        print(text)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({'old': old, 'new': new, 'regressions': regressions}, f, indent=2)
+        sys.exit(1 if regressions else 0)
+
+    data = run(args.engines, args.sets, scenarios, args.repeat)
+    print(report(data))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,158 @@
+import random
+from array import array
+from time import perf_counter
+
+from referee_opti import *
+from mcts import candidate_moves, evaluate
+from plan_trie import PlanTrie
+
+# Genetic algorithm over my next `depth` turns. A genome is an array('H') of
+# packed moves, genome[MAX_SHIPS * t + i] for my i-th ship at turn t, played
+# against the enemy plan (WAIT by default). Every generation keeps the elites,
+# fills the rest with tournament selection, one-point crossover on a turn and
+# mutation, and is evaluated through a PlanTrie.
+#
+#   ga = GA(depth=5, population=30)
+#   actions = ga.search(world, budget=0.045)  # [(action, target)] for world.my_ships
+#   ga.stats()  # generations, generations_per_s, best...
+#
+# The population is kept from one search to the next, shifted forward by one
+# turn, so call search once per turn with the same GA. ga:bot plays with it in
+# tournament.py.
+
+
+class GA:
+    def __init__(self, depth=5, population=30, elites=2, tournament=3, crossover=0.8, mutation=0.1,
+                 evaluate=evaluate, moves=candidate_moves, enemy=None, seed=None):
+        self.depth = depth
+        self.size = population
+        self.elites = elites
+        self.tournament = tournament
+        self.crossover_rate = crossover
+        self.mutation_rate = mutation
+        self.evaluate = evaluate
+        self.moves = moves
+        self.enemy = enemy  # enemy(world) -> enemy plan
+        self.rng = random.Random(seed)
+
+        self.population = []
+        self.fitness = []
+        self.candidates = []
+        self.generations = 0
+        self.evaluations = 0
+        self.saved = 0
+        self.time = 0
+
+    def search(self, world, budget=0.045):
+        # best moves for world.my_ships, returned within `budget` seconds
+        start = perf_counter()
+        deadline = start + budget
+        self.generations = 0
+        self.evaluations = 0
+        self.saved = 0
+
+        self.candidates = [self.moves(world, ship, world.enemy_ships) for ship in world.my_ships]
+        enemy_plan = self.enemy(world) if self.enemy is not None else ()
+
+        if self.population:
+            self.shift()
+        while len(self.population) < self.size:
+            self.population.append(self.random_genome())
+        self.fitness = self.evaluate_all(world, self.population, enemy_plan)
+
+        generation_time = 0
+        while perf_counter() + generation_time < deadline:
+            generation_start = perf_counter()
+            self.generation(world, enemy_plan)
+            self.generations += 1
+            generation_time = perf_counter() - generation_start
+
+        self.time = perf_counter() - start
+        best = self.population[self.fitness.index(max(self.fitness))]
+        return [unpack_move(move) for move in best[:len(world.my_ships)]]
+
+    def random_genome(self):
+        genome = array('H', [Action.WAIT]) * (self.depth * MAX_SHIPS)
+        for t in range(self.depth):
+            for i, moves in enumerate(self.candidates):
+                genome[MAX_SHIPS * t + i] = self.rng.choice(moves)
+        return genome
+
+    def shift(self):
+        # drop the turn just played, and add a random one at the end
+        last = MAX_SHIPS * (self.depth - 1)
+        for genome in self.population:
+            del genome[:MAX_SHIPS]
+            genome.extend([Action.WAIT] * MAX_SHIPS)
+            for i, moves in enumerate(self.candidates):
+                genome[last + i] = self.rng.choice(moves)
+
+    def evaluate_all(self, world, genomes, enemy_plan):
+        ships = len(world.my_ships)
+        trie = PlanTrie()
+        for genome in genomes:
+            trie.insert([genome[MAX_SHIPS * t:MAX_SHIPS * t + ships] for t in range(self.depth)], enemy_plan)
+        fitness = trie.evaluate(world, self.evaluate)
+        self.evaluations += len(genomes)
+        self.saved += trie.saved
+        return fitness
+
+    def select(self):
+        # tournament selection
+        best = self.rng.randrange(self.size)
+        for _ in range(self.tournament - 1):
+            other = self.rng.randrange(self.size)
+            if self.fitness[other] > self.fitness[best]:
+                best = other
+        return self.population[best]
+
+    def crossover(self, a, b):
+        if self.rng.random() >= self.crossover_rate:
+            return array('H', a)
+        cut = MAX_SHIPS * self.rng.randrange(1, self.depth) if self.depth > 1 else 0
+        return a[:cut] + b[cut:]
+
+    def mutate(self, genome):
+        rng = self.rng
+        for t in range(self.depth):
+            for i, moves in enumerate(self.candidates):
+                if rng.random() < self.mutation_rate:
+                    genome[MAX_SHIPS * t + i] = rng.choice(moves)
+        return genome
+
+    def generation(self, world, enemy_plan):
+        order = sorted(range(self.size), key=self.fitness.__getitem__, reverse=True)
+        elites = order[:self.elites]
+        population = [self.population[i] for i in elites]
+        fitness = [self.fitness[i] for i in elites]
+
+        children = [self.mutate(self.crossover(self.select(), self.select()))
+                    for _ in range(self.size - len(population))]
+
+        self.population = population + children
+        self.fitness = fitness + self.evaluate_all(world, children, enemy_plan)
+
+    def stats(self):
+        return {
+            'generations': self.generations,
+            'time': self.time,
+            'generations_per_s': self.generations / self.time if self.time else 0,
+            'evaluations': self.evaluations,
+            'updates_saved': self.saved,
+            'best': max(self.fitness) if self.fitness else None,
+        }
+
+
+# a searcher and the progress() of its last world by side (the owner of my
+# ships), a new one on a new game, seeded with its first world so that the
+# games of a seed are played again (as far as the time budget allows)
+_searchers = {}
+
+
+def bot(world):
+    side = world.my_ships[0].owner
+    searcher, last = _searchers.get(side, (None, None))
+    if not next_turn(world, last):
+        searcher = GA(seed=world.hash)
+    _searchers[side] = searcher, progress(world)
+    return searcher.search(world)
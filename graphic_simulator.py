@@ -1,6 +1,6 @@
+import sys
+
 import pygame
-from _dummy_thread import start_new_thread
-from collections import deque
 from pygame import gfxdraw
 from pygame.locals import *
 
@@ -8,7 +8,8 @@ from referee_opti import *
 
 mode = 'graphics'
 
-from v9_AG import *
+from history import History
+from simulation import Simulation
 from debugging import *
 from math import pi, sqrt, cos, sin
 
@@ -18,6 +19,8 @@ pygame.key.set_repeat(500, 50)
 GRID_SIZE = 20
 HEXA_WIDTH = sqrt(3) / 2 * GRID_SIZE
 SCREEN_SIZE = (int(HEXA_WIDTH * 23.5 * 2 + 1 + 0), int(GRID_SIZE * 43 * 3 / 4))
+FPS = 60
+SPEEDS = (1, 2, 5, 10, 20, 50)  # turns per second when playing
 
 
 # colors
@@ -37,7 +40,7 @@ FONT = pygame.font.Font('segoeuil.ttf', 20)
 SMALL_FONT = pygame.font.Font('segoeuil.ttf', 12)
 
 screen = pygame.display.set_mode(SCREEN_SIZE)
-worlds = [get_random_world()]
+worlds = History(get_random_world())
 
 
 def to_screen_coord(pos):
@@ -51,80 +54,129 @@ def to_screen_coord(pos):
     return (new_x, new_y)
 
 
-def draw_hex(screen, pos, color=BLACK, fill=True, info=None):
-    screen_pos = to_screen_coord(pos)
+def hex_points(center):
+    return [(center[0] + GRID_SIZE * cos(pi / 180 * (60 * i + 30)),
+             center[1] + GRID_SIZE * sin(pi / 180 * (60 * i + 30))) for i in range(6)]
+
+
+# screen centers, hexagon vertices and the rect to redraw of every cell id
+CENTERS = [to_screen_coord(to_coord(cell)) for cell in range(CELLS + 1)]
+HEX_POINTS = [hex_points(center) for center in CENTERS]
+HEX_RECTS = [pygame.Rect(center[0] - HEXA_WIDTH - 2, center[1] - GRID_SIZE - 2,
+                         2 * HEXA_WIDTH + 5, 2 * GRID_SIZE + 5) for center in CENTERS]
+
+GLYPHS = {}
+
+
+def glyph(font, value):
+    # rendered text of a value, rendered only the first time
+    surface = GLYPHS.get((font, value))
+    if surface is None:
+        surface = GLYPHS[font, value] = font.render(str(value), True, BLACK)
+    return surface
 
-    points = []
-    for i in range(6):
-        angle_deg = 60 * i + 30
-        angle_rad = pi / 180 * angle_deg
-        point = (screen_pos[0] + GRID_SIZE * cos(angle_rad),
-                 screen_pos[1] + GRID_SIZE * sin(angle_rad))
-        points.append(point)
 
+def draw_text(screen, font, value, center):
+    text = glyph(font, value)
+    rect = text.get_rect()
+    rect.center = center
+    screen.blit(text, rect)
+
+
+def draw_hex(screen, cell, color=BLACK, fill=True, info=None):
+    points = HEX_POINTS[cell]
     if fill:
         gfxdraw.filled_polygon(screen, points, color)
     gfxdraw.aapolygon(screen, points, color)
 
-
     if info is not None:
-        # dist to (5, 5)
-        dist_text = FONT.render(str(info), True, BLACK)
-        dist_rect = dist_text.get_rect()
-        dist_rect.center = screen_pos
-        screen.blit(dist_text, dist_rect)
+        draw_text(screen, FONT, info, CENTERS[cell])
+    return HEX_RECTS[cell]
 
 
 def draw_grid(screen):
     for x in range(23):
         for y in range(21):
-            draw_hex(screen, Coord(x, y), BLACK, False)
+            draw_hex(screen, cell_of(x, y), BLACK, False)
+
+
+def make_background():
+    # the grid does not change, it is drawn once and blitted under the entities
+    background = pygame.Surface(SCREEN_SIZE).convert()
+    background.fill(WHITE)
+    draw_grid(background)
+    return background
 
 
-def draw_circle(screen, pos, color=RED, size=10, fill=True, info=None):
-    screen_pos = to_screen_coord(pos)
-    x = int(screen_pos[0])
-    y = int(screen_pos[1])
+def draw_circle(screen, cell, color=RED, size=10, fill=True, info=None):
+    x = int(CENTERS[cell][0])
+    y = int(CENTERS[cell][1])
 
     if fill:
         gfxdraw.filled_circle(screen, x, y, size, color)
     gfxdraw.aacircle(screen, x, y, size, color)
 
     if info is not None:
-        # dist to (5, 5)
-        dist_text = SMALL_FONT.render(str(info), True, BLACK)
-        dist_rect = dist_text.get_rect()
-        dist_rect.center = x, y
-        screen.blit(dist_text, dist_rect)
+        draw_text(screen, SMALL_FONT, info, (x, y))
+    return pygame.Rect(x - size - 1, y - size - 1, 2 * size + 3, 2 * size + 3)
 
 
 def draw_world(screen, world: World):
-    for ship in world.my_ships:
-        draw_hex(screen, ship.pos, GREEN, info=ship.health)
-        draw_hex(screen, ship.stern, GREEN, info=ship.health)
-        draw_hex(screen, ship.bow, DK_GREEN, info=ship.speed)
-
-
-    for ship in world.enemy_ships:
-        draw_hex(screen, ship.pos, RED, info=ship.health)
-        draw_hex(screen, ship.stern, RED, info=ship.health)
-        draw_hex(screen, ship.bow, DK_RED, info=ship.speed)
+    # draws the entities and returns the rects they cover
+    rects = []
+    for ships, color, bow_color in ((world.my_ships, GREEN, DK_GREEN), (world.enemy_ships, RED, DK_RED)):
+        for ship in ships:
+            rects.append(draw_hex(screen, ship.pos, color, info=ship.health))
+            rects.append(draw_hex(screen, ship.stern, color, info=ship.health))
+            rects.append(draw_hex(screen, ship.bow, bow_color, info=ship.speed))
 
     for mine in world.mines:
-        draw_hex(screen, mine.pos, GREY_25)
+        rects.append(draw_hex(screen, mine.pos, GREY_25))
 
     for barrel in world.barrels:
-        draw_hex(screen, barrel.pos, BLUE, info=barrel.health)
+        rects.append(draw_hex(screen, barrel.pos, BLUE, info=barrel.health))
 
     for boom in world.cannon_balls:
         if boom.remaining_turns != 0:
-            draw_circle(screen, boom.pos, ORANGE, GRID_SIZE//2, 1, boom.remaining_turns)
+            rects.append(draw_circle(screen, boom.pos, ORANGE, GRID_SIZE//2, 1, boom.remaining_turns))
+
+    return rects
+
+
+# the hardcoded actions of RIGHT
+def my_bot(world):
+    return [(Action.DROITE, None) for _ in world.my_ships]
+
 
+def enemy_bot(world):
+    return [(Action.FASTER, None) for _ in world.my_ships]
 
-def main():
-    global new_world
+
+def main(replay_path=None, bots=(my_bot, enemy_bot)):
+    global worlds
 
     histo_pos = 0
+    replay = None
+    game = 0
+    if replay_path is not None:
+        from replay import Replay
+        replay = Replay(replay_path)
+        worlds = History.from_replay(replay, game)
+
+    background = make_background()
+    screen.blit(background, (0, 0))
+    pygame.display.flip()
+    clock = pygame.time.Clock()
+    dirty = []
+    drawn = None
+
+    # the worker plays ahead from the end of the history, the loop below only takes its turns:
+    # one per RIGHT at the end, `speed` per second when playing, all of them to run to the end
+    simulation = Simulation(worlds.last, bots)
+    mode = 'step'
+    steps = 0
+    speed = 2
+    due = 0
 
     run = True
     while run:
@@ -145,32 +197,71 @@ def main():
                         histo_pos += 1
 
                     else:
-                        new_world = worlds[-1].copy()
+                        steps += 1
 
-                        en_actions = [(Action.FASTER, None) for _ in new_world.enemy_ships]
-                        my_actions = [(Action.DROITE, None) for _ in new_world.my_ships]
+                if event.key == K_SPACE:
+                    mode = 'play' if mode != 'play' else 'step'
+                    due = 0
 
-                        new_world.prepare()
-                        new_world.set_actions(0, en_actions)
-                        new_world.set_actions(1, my_actions)
+                if event.key == K_e:
+                    mode = 'end' if mode != 'end' else 'step'
 
-                        new_world.update()
+                if event.key in (K_UP, K_DOWN):
+                    i = SPEEDS.index(speed) + (1 if event.key == K_UP else -1)
+                    speed = SPEEDS[max(0, min(i, len(SPEEDS) - 1))]
 
-                        worlds.append(new_world)
+                if event.key == K_HOME:
+                    histo_pos = 0
 
-                        histo_pos = len(worlds) - 1
+                if event.key == K_END:
+                    histo_pos = len(worlds) - 1
 
-                if event.key == K_r:
-                    worlds.clear()
-                    worlds.append(get_random_world())
+                if event.key in (K_PAGEUP, K_PAGEDOWN) and replay is not None:
+                    game = (game + (1 if event.key == K_PAGEDOWN else -1)) % len(replay.games)
+                    worlds = History.from_replay(replay, game)
                     histo_pos = 0
+                    simulation.stop()
+                    simulation = Simulation(worlds.last, bots)
 
-        screen.fill(WHITE)
-        draw_grid(screen)
-        draw_world(screen, worlds[histo_pos])
-        pygame.display.flip()
+                if event.key == K_r:
+                    worlds = History(get_random_world())
+                    histo_pos = 0
+                    simulation.stop()
+                    simulation = Simulation(worlds.last, bots)
+
+        if mode == 'play':
+            due += speed / FPS
+            steps = int(due)
+            due -= steps
+        elif mode == 'end':
+            steps = simulation.ready()
+        while steps > 0:
+            moves = simulation.take()
+            if moves is None:
+                break
+            steps -= 1
+            worlds.append(*moves)
+            histo_pos = len(worlds) - 1
+        if simulation.over:
+            mode = 'step'
+            steps = 0
+
+        # the worlds of the history are reused, what is on screen is known by its turn
+        if (worlds, histo_pos) != drawn:
+            world = worlds[histo_pos]
+            # only what the entities of the last and of this frame cover is redrawn
+            for rect in dirty:
+                screen.blit(background, rect, rect)
+            rects = draw_world(screen, world)
+            pygame.display.update(dirty + rects)
+            dirty = rects
+            drawn = (worlds, histo_pos)
+        clock.tick(FPS)
+
+    simulation.stop()
 
 if __name__ == '__main__':
-    main()
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
 else:
-    start_new_thread(main, tuple())
\ No newline at end of file
+    # like _dummy_thread.start_new_thread did: pygame wants the main thread
+    main()
\ No newline at end of file
@@ -0,0 +1,71 @@
+from referee_opti import *
+
+# History of a game, for the time machine of graphic_simulator.py: a copy of the
+# world every `every` turns and only the moves of the other turns. The world of
+# a turn is the keyframe before it with the moves played again, so going
+# forward one turn is a single update and any jump at most `every` updates.
+#
+#   history = History(world)
+#   history.append(my_moves, enemy_moves)  # plays a turn on the last world
+#   history[t]  # the world at turn t, shared: copy it to change it
+#   history = History.from_replay(Replay('games.rpl'), game=3)
+#
+# The referee is deterministic, so this gives back exactly the worlds played.
+
+
+class History:
+    def __init__(self, world, every=10):
+        self.every = every
+        self.keyframes = [world.copy()]
+        self.moves = []  # (my moves, enemy moves) of each turn, packed
+        self.last = world.copy()
+        self.current = world.copy()
+        self.turn = 0  # of self.current
+
+    @classmethod
+    def from_replay(cls, replay, game=0, every=10):
+        # the keyframes are decoded from the records, nothing is played
+        from replay import decode, record_moves
+
+        records = replay.game(game)
+        history = cls(decode(records[0]), every)
+        history.keyframes.extend(decode(records[t]) for t in range(every, len(records), every))
+        history.moves = [record_moves(record) for record in records[:-1]]
+        history.last = decode(records[-1])
+        return history
+
+    def __len__(self):
+        return len(self.moves) + 1
+
+    def __getitem__(self, turn):
+        return self.world(turn)
+
+    def append(self, my_moves, enemy_moves):
+        # plays a turn after the last one, and returns its world
+        moves = (pack_moves(my_moves), pack_moves(enemy_moves))
+        last = self.last
+        last.play((last.my_ships[:], last.enemy_ships[:]), moves)
+        self.moves.append(moves)
+        if len(self.moves) % self.every == 0:
+            self.keyframes.append(last.copy())
+        return last
+
+    def world(self, turn):
+        if turn < 0:
+            turn += len(self)
+        if not 0 <= turn < len(self):
+            raise IndexError(turn)
+        if turn == len(self) - 1:
+            return self.last
+
+        # from the keyframe, unless the current world is before and closer
+        keyframe = turn // self.every * self.every
+        if turn < self.turn or self.turn < keyframe:
+            self.current = self.keyframes[keyframe // self.every].copy()
+            self.turn = keyframe
+
+        current = self.current
+        while self.turn < turn:
+            current.play((current.my_ships[:], current.enemy_ships[:]), self.moves[self.turn])
+            self.turn += 1
+        return current
@@ -0,0 +1,158 @@
+import json
+from time import perf_counter
+
+from referee_opti import World, Mine
+
+# Opt-in profiling of World.update: while an Instrument is enabled, the phases
+# below are wrapped to count their calls and time them, per call stack (so
+# check_all_collisions from move_ships and from rotate_ships are apart).
+# Nothing is wrapped the rest of the time, so it costs nothing when disabled.
+#
+#   with Instrument(caches={'tt': tt}) as instrument:
+#       ... search ...
+#   instrument.stats()  # or to_json(path), collapsed(path) for flamegraph.pl
+#
+# caches are reported with their hit ratio: anything with cache_info() (an
+# lru_cache) or stats() with probes and hits (a TranspositionTable).
+
+PHASES = (
+    (World, ('update', 'prepare', 'set_actions', 'copy', 'record', 'undo', 'move_cannonbals', 'decrement_rhum',
+             'update_initial_rum', 'apply_actions', 'move_ships', 'rotate_ships', 'check_all_collisions',
+             'explode_ships', 'explode_mines', 'explode_barrels')),
+    (Mine, ('explode',)),
+)
+ENTITIES = ('ships', 'barrels', 'mines', 'cannon_balls')
+
+
+class Instrument:
+    def __init__(self, caches=None):
+        self.caches = caches or {}
+        self.originals = None
+        self.reset()
+
+    def reset(self):
+        self.stack = []
+        self.calls = {}  # call stack -> number of calls
+        self.time = {}  # call stack -> seconds, children included
+        self.children = {}  # call stack -> seconds in the children
+        self.updates = 0
+        self.entities = {e: [0, 0] for e in ENTITIES}  # sum and max at the start of update
+
+    def enable(self):
+        if self.originals is not None:
+            return
+        self.originals = []
+        for cls, names in PHASES:
+            for name in names:
+                method = cls.__dict__[name]
+                self.originals.append((cls, name, method))
+                label = name if cls is World else cls.__name__ + '.' + name
+                setattr(cls, name, self.wrap(label, method))
+
+    def disable(self):
+        if self.originals is None:
+            return
+        for cls, name, method in self.originals:
+            setattr(cls, name, method)
+        self.originals = None
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def wrap(self, label, method):
+        stack = self.stack
+        calls = self.calls
+        time = self.time
+        children = self.children
+        count = self.count if label == 'update' else None
+
+        def wrapper(*args, **kwargs):
+            if count is not None:
+                count(args[0])
+            stack.append(label)
+            key = tuple(stack)
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                stack.pop()
+                calls[key] = calls.get(key, 0) + 1
+                time[key] = time.get(key, 0) + elapsed
+                if stack:
+                    parent = tuple(stack)
+                    children[parent] = children.get(parent, 0) + elapsed
+
+        return wrapper
+
+    def count(self, world):
+        self.updates += 1
+        for name, n in (('ships', len(world.my_ships) + len(world.enemy_ships)), ('barrels', len(world.barrel_at)),
+                        ('mines', len(world.mine_at)), ('cannon_balls', len(world.cannon_balls))):
+            e = self.entities[name]
+            e[0] += n
+            if n > e[1]:
+                e[1] = n
+
+    def self_time(self, key):
+        return self.time[key] - self.children.get(key, 0)
+
+    def stats(self):
+        phases = {}
+        for key, calls in self.calls.items():
+            p = phases.setdefault(key[-1], {'calls': 0, 'time': 0, 'self_time': 0})
+            p['calls'] += calls
+            if key[-1] not in key[:-1]:  # do not count recursive calls twice
+                p['time'] += self.time[key]
+            p['self_time'] += self.self_time(key)
+        for p in phases.values():
+            p['mean_us'] = 1e6 * p['time'] / p['calls']
+
+        caches = {}
+        for name, cache in self.caches.items():
+            if hasattr(cache, 'cache_info'):
+                info = cache.cache_info()
+                hits, probes = info.hits, info.hits + info.misses
+            else:
+                info = cache.stats()
+                hits, probes = info['hits'], info['probes']
+            caches[name] = {'hits': hits, 'probes': probes, 'hit_rate': hits / probes if probes else 0}
+
+        return {
+            'updates': self.updates,
+            'phases': phases,
+            'stacks': {';'.join(key): {'calls': calls, 'time': self.time[key], 'self_time': self.self_time(key)}
+                       for key, calls in self.calls.items()},
+            'entities': {name: {'mean': s / self.updates if self.updates else 0, 'max': m}
+                         for name, (s, m) in self.entities.items()},
+            'caches': caches,
+        }
+
+    def to_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.stats(), f, indent=2)
+
+    def collapsed(self, path=None):
+        # one 'a;b;c microseconds' line per call stack, the input of flamegraph.pl
+        text = '\n'.join('{} {}'.format(';'.join(key), int(1e6 * self.self_time(key)))
+                         for key in sorted(self.calls)) + '\n'
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+    def report(self):
+        stats = self.stats()
+        lines = ['{} updates'.format(stats['updates'])]
+        for name, p in sorted(stats['phases'].items(), key=lambda item: -item[1]['self_time']):
+            lines.append('{:<22} {:>8} calls {:>10.1f} ms {:>10.1f} ms self {:>8.2f} us/call'.format(
+                name, p['calls'], 1000 * p['time'], 1000 * p['self_time'], p['mean_us']))
+        lines.append('entities per update: ' + ', '.join(
+            '{} {:.1f} (max {})'.format(name, e['mean'], e['max']) for name, e in stats['entities'].items()))
+        for name, c in stats['caches'].items():
+            lines.append('{}: {:.1%} hits over {} probes'.format(name, c['hit_rate'], c['probes']))
+        return '\n'.join(lines)
@@ -0,0 +1,235 @@
+import random
+from math import log, sqrt
+from time import perf_counter
+
+from referee_opti import *
+
+# Monte Carlo tree search for simultaneous moves, with decoupled UCT: in each
+# node every ship (mine and the enemy's) is its own UCB1 bandit over its
+# candidate moves, and the child is the one of the joint move. Ships of the
+# enemy maximise 1 - value.
+#
+#   searcher = MCTS(policy='random', rollout_turns=5)
+#   actions = searcher.search(world, budget=0.045)  # [(action, target)] for world.my_ships
+#   searcher.stats()  # iterations, iterations_per_s, nodes, depth...
+#
+# The nodes come from a pool allocated once, so a search does not leave
+# garbage behind it for the collector. mcts:bot plays with it in tournament.py.
+
+
+def candidate_moves(world, ship, enemies):
+    # packed moves: the legal ones that change something, shots at where the
+    # enemies will be if they keep going straight (see World.moves)
+    return list(world.moves(ship, enemies))
+
+
+def evaluate(world):
+    # between 0 and 1, for my side
+    if not world.enemy_ships:
+        return 1.0 if world.my_ships else 0.5
+    if not world.my_ships:
+        return 0.0
+    rum = sum(ship.health for ship in world.my_ships) - sum(ship.health for ship in world.enemy_ships)
+    return 0.5 + rum / (2 * MAX_SHIP_HEALTH * MAX_SHIPS)
+
+
+# rollout policies: policy(world, ships, rng) -> moves of the ships
+
+ROLLOUT_MOVES = (Action.WAIT, Action.FASTER, Action.SLOWER, Action.GAUCHE, Action.DROITE)
+
+
+def random_policy(world, ships, rng):
+    return [rng.choice(ROLLOUT_MOVES) for _ in ships]
+
+
+def wait_policy(world, ships, rng):
+    return ()
+
+
+POLICIES = {
+    'random': random_policy,
+    'wait': wait_policy,
+}
+
+
+class Node:
+    __slots__ = ('visits', 'mine', 'moves', 'counts', 'values', 'children')
+
+    def __init__(self):
+        self.children = {}
+        self.reset()
+
+    def reset(self):
+        self.visits = 0
+        self.mine = 0  # the first `mine` bandits are my ships
+        self.moves = None  # candidate moves of each ship, None until expanded
+        self.counts = None
+        self.values = None
+        self.children.clear()
+
+
+class NodePool:
+    def __init__(self, size):
+        self.nodes = [Node() for _ in range(size)]
+        self.used = 0
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def new(self):
+        # a clean node, None when the pool is empty
+        if self.used == len(self.nodes):
+            return None
+        node = self.nodes[self.used]
+        self.used += 1
+        node.reset()
+        return node
+
+    def clear(self):
+        self.used = 0
+
+
+class MCTS:
+    def __init__(self, policy='random', evaluate=evaluate, moves=candidate_moves, exploration=0.5,
+                 rollout_turns=5, max_depth=20, pool_size=50000, seed=None):
+        self.policy = POLICIES.get(policy, policy)
+        self.evaluate = evaluate
+        self.moves = moves
+        self.exploration = exploration
+        self.rollout_turns = rollout_turns
+        self.max_depth = max_depth
+        self.pool = NodePool(pool_size)
+        self.rng = random.Random(seed)
+
+        self.root = None
+        self.iterations = 0
+        self.time = 0
+        self.depth = 0
+
+    def search(self, world, budget=0.045):
+        # best moves for world.my_ships found in `budget` seconds
+        start = perf_counter()
+        deadline = start + budget
+        self.pool.clear()
+        self.root = self.pool.new()
+        self.iterations = 0
+        self.depth = 0
+
+        while True:
+            self.iterate(world)
+            self.iterations += 1
+            if perf_counter() >= deadline:
+                break
+
+        self.time = perf_counter() - start
+        return self.best()
+
+    def best(self):
+        root = self.root
+        actions = []
+        for i in range(root.mine):
+            counts = root.counts[i]
+            actions.append(unpack_move(root.moves[i][counts.index(max(counts))]))
+        return actions
+
+    def expand(self, node, world):
+        node.mine = len(world.my_ships)
+        node.moves = [self.moves(world, ship, world.enemy_ships) for ship in world.my_ships] \
+                     + [self.moves(world, ship, world.my_ships) for ship in world.enemy_ships]
+        node.counts = [[0] * len(moves) for moves in node.moves]
+        node.values = [[0.0] * len(moves) for moves in node.moves]
+
+    def select(self, node):
+        picks = []
+        log_visits = log(node.visits + 1)
+        exploration = self.exploration
+        for counts, values in zip(node.counts, node.values):
+            best = 0
+            best_score = -1
+            for arm, n in enumerate(counts):
+                if n == 0:
+                    score = 2 + self.rng.random()
+                else:
+                    score = values[arm] / n + exploration * sqrt(log_visits / n)
+                if score > best_score:
+                    best = arm
+                    best_score = score
+            picks.append(best)
+        return picks
+
+    def iterate(self, root_world):
+        world = root_world.copy()
+        node = self.root
+        path = []
+        value = None
+
+        for depth in range(self.max_depth):
+            if node.moves is None:
+                self.expand(node, world)
+            picks = self.select(node)
+            path.append((node, picks))
+
+            moves = [node.moves[i][arm] for i, arm in enumerate(picks)]
+            sides = (world.my_ships[:], world.enemy_ships[:])
+            if world.play(sides, (moves[:node.mine], moves[node.mine:])):
+                value = self.evaluate(world)
+                break
+
+            key = tuple(moves)
+            child = node.children.get(key)
+            if child is None:
+                child = self.pool.new()
+                if child is not None:
+                    node.children[key] = child
+                value = self.rollout(world)
+                break
+            node = child
+        else:
+            value = self.evaluate(world)
+
+        if len(path) > self.depth:
+            self.depth = len(path)
+
+        for node, picks in path:
+            node.visits += 1
+            for i, arm in enumerate(picks):
+                node.counts[i][arm] += 1
+                node.values[i][arm] += value if i < node.mine else 1 - value
+
+    def rollout(self, world):
+        policy = self.policy
+        rng = self.rng
+        for _ in range(self.rollout_turns):
+            sides = (world.my_ships[:], world.enemy_ships[:])
+            if world.play(sides, (policy(world, sides[0], rng), policy(world, sides[1], rng))):
+                break
+        return self.evaluate(world)
+
+    def stats(self):
+        return {
+            'iterations': self.iterations,
+            'time': self.time,
+            'iterations_per_s': self.iterations / self.time if self.time else 0,
+            'nodes': self.pool.used,
+            'pool_size': len(self.pool),
+            'depth': self.depth,
+            'root_visits': self.root.visits if self.root is not None else 0,
+            'branching': [len(moves) for moves in self.root.moves] if self.root is not None and self.root.moves else [],
+        }
+
+
+# a searcher and the progress() of its last world by side (the owner of my
+# ships). search() starts from an empty tree, so on a new game only its random
+# draws start over, from the first world like ga.bot
+_searchers = {}
+
+
+def bot(world):
+    side = world.my_ships[0].owner
+    searcher, last = _searchers.get(side, (None, None))
+    if searcher is None:
+        searcher = MCTS()
+    if not next_turn(world, last):
+        searcher.rng.seed(world.hash)
+    _searchers[side] = searcher, progress(world)
+    return searcher.search(world)
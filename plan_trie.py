@@ -0,0 +1,109 @@
+from referee_opti import *
+
+# Evaluates many plans from the same world at once. The plans of a GA
+# population mostly start the same way: they are put in a trie of turns, each
+# distinct prefix is played once, and the world is only copied where plans
+# part ways.
+#
+#   trie = PlanTrie()
+#   for my_plan in population:
+#       trie.insert(my_plan, enemy_plan)
+#   scores = trie.evaluate(world, evaluate)  # one score per insert, in order
+#   trie.stats()  # updates played, and saved compared to one rollout per plan
+#
+# Plans are like for World.rollout: plan[t][i] is the (action, target) or the
+# packed move of the i-th ship alive in world, at turn t.
+
+
+class PlanTrie:
+    def __init__(self):
+        # a node is [children by turn, indices of the plans that end there]
+        self.root = [{}, []]
+        self.plans = 0
+        self.nodes = 1
+        self.updates = 0
+        self.naive_updates = 0
+
+    def __len__(self):
+        return self.plans
+
+    def insert(self, my_plan, enemy_plan=()):
+        node = self.root
+        for turn in range(max(len(my_plan), len(enemy_plan))):
+            key = (tuple(my_plan[turn]) if turn < len(my_plan) else (),
+                   tuple(enemy_plan[turn]) if turn < len(enemy_plan) else ())
+            child = node[0].get(key)
+            if child is None:
+                child = node[0][key] = [{}, []]
+                self.nodes += 1
+            node = child
+        node[1].append(self.plans)
+        self.plans += 1
+        return self.plans - 1
+
+    def evaluate(self, world, score):
+        # score(world) at the end of each plan, or when its game is over
+        scores = [None] * self.plans
+        self.updates = 0
+        self.naive_updates = 0
+        self._evaluate(self.root, world.copy(), None, 0, score, scores)
+        return scores
+
+    def _evaluate(self, node, world, sides, depth, score, scores):
+        if sides is None:
+            sides = (world.my_ships[:], world.enemy_ships[:])
+
+        if node[1]:
+            value = score(world)
+            for i in node[1]:
+                scores[i] = value
+            self.naive_updates += depth * len(node[1])
+
+        children = list(node[0].items())
+        for n, (moves, child) in enumerate(children):
+            if n < len(children) - 1:
+                branch, branch_sides = self._copy(world, sides)
+            else:
+                branch, branch_sides = world, sides
+
+            self.updates += 1
+            if branch.play(branch_sides, moves):
+                # the game is over: every plan below ends here
+                value = score(branch)
+                ends = self._ends(child)
+                for i in ends:
+                    scores[i] = value
+                self.naive_updates += (depth + 1) * len(ends)
+            else:
+                self._evaluate(child, branch, branch_sides, depth + 1, score, scores)
+
+    @staticmethod
+    def _copy(world, sides):
+        # the copy and the sides in it (the ships already sunk stay as they were)
+        copy = world.copy()
+        same = dict(zip(world.my_ships + world.enemy_ships, copy.my_ships + copy.enemy_ships))
+        return copy, tuple([same.get(ship, ship) for ship in ships] for ships in sides)
+
+    @staticmethod
+    def _ends(node):
+        ends = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            ends.extend(node[1])
+            stack.extend(node[0].values())
+        return ends
+
+    @property
+    def saved(self):
+        return self.naive_updates - self.updates
+
+    def stats(self):
+        return {
+            'plans': self.plans,
+            'nodes': self.nodes,
+            'updates': self.updates,
+            'naive_updates': self.naive_updates,
+            'saved': self.saved,
+            'saved_ratio': self.saved / self.naive_updates if self.naive_updates else 0,
+        }
@@ -0,0 +1,296 @@
+import heapq
+from array import array
+
+import numpy as np
+
+from referee_opti import *
+
+# Shortest paths in turns over the states of a ship, state = 3 * pose + speed
+# (like END_POSES), with the moves of the referee: the action changes the speed
+# or the orientation, the ship moves (END_POSES), then turns on its new cell.
+# A field gives, for every state, the number of turns to get a target cell
+# under the hull (a barrel is picked up as soon as the hull goes over it, so
+# the cells swept during the turn count), without going over a mine:
+#
+#   planner = Planner()
+#   planner.update(world)  # the mines to avoid, once per turn
+#   planner.turns(ship, barrel.pos)  # None if it can't be reached
+#   planner.move(ship, barrel.pos)  # the first action of a shortest path
+#
+# Fields are computed once per target and kept. When mines appear, only the
+# states whose path goes over one of them are computed again; when a mine
+# disappears every field is dropped, and planner.keep(cells) drops the fields
+# of the targets that are gone. Other ships are ignored.
+
+STATES = 3 * POSES
+MOVES = (Action.WAIT, Action.FASTER, Action.SLOWER, Action.GAUCHE, Action.DROITE)
+UNREACHABLE = 255
+REACH = 2 * MAX_SHIP_SPEED  # no part of a ship gets further than this from its center in a turn
+
+# edge 5 * state + i is MOVES[i] played from state: EDGE_NEXT the state after
+# it, EDGE_MASKS the cells the hull goes over, PREDECESSORS[state] the edges
+# that lead to it
+EDGE_NEXT = array('i')
+EDGE_MASKS = []
+PREDECESSORS = [[] for _ in range(STATES)]
+for _state in range(STATES):
+    _pose, _speed = divmod(_state, 3)
+    for _action in MOVES:
+        _i = 3 * _pose + NEW_SPEED[3 * _action + _speed]
+        _end = 6 * (END_POSES[_i] // 6) + NEW_ORI[6 * _action + _pose % 6]
+        _next = 3 * _end + END_SPEEDS[_i]
+        if _pose // 6 >= MAP_CELLS:
+            _next = -1  # a ship is never there
+        else:
+            PREDECESSORS[_next].append(len(EDGE_NEXT))
+        EDGE_NEXT.append(_next)
+        EDGE_MASKS.append(SWEEPS[_i] | HULLS[_end])
+
+# the same for numpy: EDGE_CELLS the cells of EDGE_MASKS padded with OFF_MAP,
+# and the edges sorted by the state they lead to, PREDECESSORS[state] being
+# V_PREDECESSORS[V_PRED_START[state]:V_PRED_START[state + 1]]
+V_EDGE_FROM = np.repeat(np.arange(STATES, dtype=np.int32), len(MOVES))
+V_EDGE_NEXT = np.array(EDGE_NEXT, dtype=np.int32)
+_bytes = (CELLS + 8) // 8
+_packed = np.frombuffer(b''.join(_m.to_bytes(_bytes, 'little') for _m in EDGE_MASKS), np.uint8).reshape(-1, _bytes)
+_edges, _columns = np.nonzero(_packed)
+_rows, _bits = np.nonzero(np.unpackbits(_packed[_edges, _columns, None], axis=1, bitorder='little'))
+_edges, _cells = _edges[_rows], 8 * _columns[_rows] + _bits
+_counts = np.bincount(_edges, minlength=len(EDGE_MASKS))
+EDGE_CELLS = np.full((len(EDGE_MASKS), _counts.max()), OFF_MAP, dtype=np.int16)
+EDGE_CELLS[_edges, np.arange(len(_edges)) - np.repeat(np.cumsum(_counts) - _counts, _counts)] = _cells
+V_PREDECESSORS = np.array([_e for _state in range(STATES) for _e in PREDECESSORS[_state]], dtype=np.int32)
+V_PRED_START = np.zeros(STATES + 1, dtype=np.int64)
+V_PRED_START[1:] = np.cumsum([len(_p) for _p in PREDECESSORS])
+
+
+def cell_flags(mask):
+    # the bitboard as a bool array by cell
+    return np.unpackbits(np.frombuffer(mask.to_bytes(_bytes, 'little'), np.uint8),
+                         bitorder='little')[:CELLS + 1].astype(bool)
+
+
+def state_of(ship):
+    return 18 * ship.pos + 3 * ship.ori + ship.speed
+
+
+class Field:
+    __slots__ = ('target', 'turns', 'edges')
+
+    def __init__(self, target, mines):
+        # backward breadth-first search from the edges that reach the target
+        self.target = target
+        self.turns = turns = bytearray([UNREACHABLE]) * STATES
+        self.edges = edges = array('i', [-1]) * STATES  # first edge of a shortest path
+        bit = CELL_BITS[target]
+
+        frontier = []
+        distances = DISTANCES[target]
+        for cell in range(MAP_CELLS):
+            if distances[cell] > REACH:
+                continue
+            for state in range(18 * cell, 18 * cell + 18):
+                if HULLS[state // 3] & bit:
+                    turns[state] = 0
+                    continue
+                for edge in range(5 * state, 5 * state + 5):
+                    if EDGE_MASKS[edge] & bit and not EDGE_MASKS[edge] & mines:
+                        turns[state] = 1
+                        edges[state] = edge
+                        frontier.append(state)
+                        break
+
+        # then one numpy step per turn, over the edges that lead to the frontier
+        v_turns = np.frombuffer(turns, np.uint8)
+        v_edges = np.frombuffer(edges, np.int32)
+        blocked = cell_flags(mines & ~CELL_BITS[OFF_MAP])[EDGE_CELLS].any(1)
+        frontier = np.array(frontier, dtype=np.int32)
+        distance = 1
+        while len(frontier) and distance + 1 < UNREACHABLE:
+            distance += 1
+            counts = V_PRED_START[frontier + 1] - V_PRED_START[frontier]
+            starts = np.repeat(V_PRED_START[frontier] - np.cumsum(counts) + counts, counts)
+            into = V_PREDECESSORS[starts + np.arange(len(starts))]
+            into = into[~blocked[into]]
+            previous = V_EDGE_FROM[into]
+            new = v_turns[previous] == UNREACHABLE
+            previous, first = np.unique(previous[new], return_index=True)
+            v_turns[previous] = distance
+            v_edges[previous] = into[new][first]
+            frontier = previous
+
+    def repair(self, mines, new_mines):
+        # the states whose path goes over a new mine, and the ones going through
+        # them, get their turns back from the others; returns how many
+        turns, edges = self.turns, self.edges
+        v_edges = np.frombuffer(edges, np.int32)
+        broken = cell_flags(new_mines & ~CELL_BITS[OFF_MAP])[EDGE_CELLS[v_edges]].any(1) & (v_edges >= 0)
+        broken = np.flatnonzero(broken).tolist()
+        if not broken:
+            return 0
+
+        affected = set(broken)
+        stack = broken
+        while stack:
+            state = stack.pop()
+            for edge in PREDECESSORS[state]:
+                previous = edge // 5
+                if edges[previous] == edge and previous not in affected:
+                    affected.add(previous)
+                    stack.append(previous)
+
+        bit = CELL_BITS[self.target]
+        for state in affected:
+            turns[state] = UNREACHABLE
+            edges[state] = -1
+        heap = []
+        for state in affected:
+            best = UNREACHABLE
+            for edge in range(5 * state, 5 * state + 5):
+                if EDGE_MASKS[edge] & mines or EDGE_NEXT[edge] < 0:
+                    continue
+                if EDGE_MASKS[edge] & bit:
+                    distance = 1
+                else:
+                    distance = turns[EDGE_NEXT[edge]] + 1
+                if distance < best:
+                    best = distance
+                    edges[state] = edge
+            if best < UNREACHABLE:
+                turns[state] = best
+                heapq.heappush(heap, (best, state))
+
+        while heap:
+            distance, state = heapq.heappop(heap)
+            if distance != turns[state] or distance + 1 >= UNREACHABLE:
+                continue
+            for edge in PREDECESSORS[state]:
+                previous = edge // 5
+                if previous in affected and distance + 1 < turns[previous] and not EDGE_MASKS[edge] & mines:
+                    turns[previous] = distance + 1
+                    edges[previous] = edge
+                    heapq.heappush(heap, (distance + 1, previous))
+        return len(affected)
+
+
+class Planner:
+    def __init__(self, mines=0):
+        self.mine_mask = mines  # bitboard of the cells to keep off
+        self.fields = {}
+        self.hits = 0
+        self.misses = 0
+        self.repaired = 0
+
+    def update(self, world):
+        mines = world.mine_mask & ~CELL_BITS[OFF_MAP]
+        if mines & ~self.mine_mask:
+            self.add_mines(mines & ~self.mine_mask)
+        if self.mine_mask & ~mines:
+            # paths can only get shorter, nothing to repair from
+            self.fields.clear()
+            self.mine_mask = mines
+
+    def keep(self, targets):
+        # forgets the fields of the other targets
+        for target in [t for t in self.fields if t not in targets]:
+            del self.fields[target]
+
+    def add_mines(self, mask):
+        self.mine_mask |= mask
+        for field in self.fields.values():
+            self.repaired += field.repair(self.mine_mask, mask)
+
+    def field(self, target):
+        field = self.fields.get(target)
+        if field is None:
+            self.misses += 1
+            field = self.fields[target] = Field(target, self.mine_mask)
+        else:
+            self.hits += 1
+        return field
+
+    def turns(self, ship, target):
+        turns = self.field(target).turns[state_of(ship)]
+        return turns if turns != UNREACHABLE else None
+
+    def move(self, ship, target):
+        # the action to play now, None if the target can't be reached or is already under the hull
+        edge = self.field(target).edges[state_of(ship)]
+        return MOVES[edge % 5] if edge >= 0 else None
+
+    def toward(self, ship, target):
+        # without a field: the action that brings the center the closest to
+        # target (or the hull over it) this turn, keeping off the mines
+        state = state_of(ship)
+        distances = DISTANCES[target]
+        best, action = UNREACHABLE, None
+        for i, move in enumerate(MOVES):
+            edge = 5 * state + i
+            if EDGE_MASKS[edge] & self.mine_mask:
+                continue
+            distance = 0 if EDGE_MASKS[edge] & CELL_BITS[target] else distances[EDGE_NEXT[edge] // 18]
+            if distance < best:
+                best, action = distance, move
+        return action
+
+    def path(self, ship, target):
+        # the actions of a shortest path
+        field = self.field(target)
+        state = state_of(ship)
+        actions = []
+        while field.edges[state] >= 0:
+            edge = field.edges[state]
+            actions.append(MOVES[edge % 5])
+            if EDGE_MASKS[edge] & CELL_BITS[target]:
+                break
+            state = EDGE_NEXT[edge]
+        return actions
+
+    def stats(self):
+        return {
+            'fields': len(self.fields),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / (self.hits + self.misses) if self.hits + self.misses else 0,
+            'repaired_states': self.repaired,
+        }
+
+
+# a planner and the progress() of its last world by side, like ga.bot
+_planners = {}
+
+
+def bot(world, candidates=3, new_fields=2):
+    # goes to the barrel it reaches the soonest among the closest ones, a bot
+    # for tournament.py. A field takes about 15 ms the first time, so at most
+    # `new_fields` are computed per turn: the other barrels wait for the next
+    # turns, and a ship with none of its fields yet heads for the closest one.
+    side = world.my_ships[0].owner
+    planner, last = _planners.get(side, (None, None))
+    if not next_turn(world, last):
+        planner = Planner()
+    _planners[side] = planner, progress(world)
+    planner.keep(world.barrel_at)
+    planner.update(world)
+
+    actions = []
+    for ship in world.my_ships:
+        best, target = UNREACHABLE, None
+        distances = DISTANCES[ship.pos]
+        closest = sorted(world.barrel_at, key=distances.__getitem__)[:candidates]
+        for barrel in closest:
+            if barrel not in planner.fields:
+                if not new_fields:
+                    continue
+                new_fields -= 1
+            turns = planner.turns(ship, barrel)
+            if turns is not None and turns < best:
+                best, target = turns, barrel
+        if target is not None:
+            action = planner.move(ship, target)
+        elif closest and not all(barrel in planner.fields for barrel in closest):
+            action = planner.toward(ship, closest[0])
+        else:
+            action = None  # nothing left, or nothing it can reach
+        actions.append((action if action is not None else Action.WAIT, None))
+    return actions
@@ -117,11 +117,13 @@ class Mine(Entity):
 
     def explode(self, ships, force):
         victim = None
+        exploded = False
 
         for ship in ships:
             if self.pos == ship.bow() or self.pos == ship.stern() or self.pos == ship.pos:
                 ship.damage(MINE_DAMAGE)
                 victim = ship
+                exploded = True
 
         if force or victim is not None:
 
@@ -130,6 +132,9 @@ class Mine(Entity):
                     if ship.stern().distance_to(self.pos) <= 1 or ship.bow().distance_to(
                             self.pos) <= 1 or ship.pos.distance_to(self.pos) <= 1:
                         ship.damage(NEAR_MINE_DAMAGE)
+                        exploded = True
+
+        return exploded
 
     def copy(self):
         return Mine(self.pos.x, self.pos.y)
@@ -349,18 +354,22 @@ class World:
                                 self.mines.append(mine)
                 elif ship.action == Action.FIRE:
                     dist = ship.bow().distance_to(ship.target)
-                    travel_time = int(1 + round(dist / 3))
-                    self.cannon_balls.append(CannonBall(ship.target.x, ship.target.y, travel_time))
+                    if ship.target.is_inside_map() and dist <= FIRE_DISTANCE_MAX and ship.canon_cooldown == 0:
+                        travel_time = int(1 + round(dist / 3))
+                        self.cannon_balls.append(CannonBall(ship.target.x, ship.target.y, travel_time))
+                        ship.canon_cooldown = COOLDOWN_CANNON
 
-    def check_collisions(self, ship):
-        to_del = []
-        for i, barrel in enumerate(self.barrels):
-            if ship.at(barrel.pos):
-                ship.heal(barrel.health)
-                to_del.append(i)
+    def check_collisions(self):
+        # like the game, every ship takes its barrels before the mines explode
+        for ship in self.ships:
+            to_del = []
+            for i, barrel in enumerate(self.barrels):
+                if ship.at(barrel.pos):
+                    ship.heal(barrel.health)
+                    to_del.append(i)
 
-        for i, j in enumerate(to_del):
-            del self.barrels[i - j]
+            for i, j in enumerate(to_del):
+                del self.barrels[j - i]
 
         to_del = []
         for i, mine in enumerate(self.mines):
@@ -370,7 +379,7 @@ class World:
                 to_del.append(i)
 
         for i, j in enumerate(to_del):
-            del self.barrels[i - j]
+            del self.mines[j - i]
 
     def move_ships(self):
         for i in range(1, MAX_SHIP_SPEED + 1):
@@ -423,8 +432,7 @@ class World:
                 ship.pos = ship.new_pos_coord
 
             # check mines / rhum
-            for ship in self.ships:
-                self.check_collisions(ship)
+            self.check_collisions()
 
     def rotate_ships(self):
 
@@ -469,8 +477,7 @@ class World:
             ship.ori = ship.new_ori
 
         # check mines / rhum
-        for ship in self.ships:
-            self.check_collisions(ship)
+        self.check_collisions()
 
         if debug == 'ROTATE':
             step('EXIT', 1)
@@ -1,6 +1,7 @@
 import sys
-from collections import namedtuple
-from functools import lru_cache
+
+from topology import *
+from zobrist import *
 
 MAP_WIDTH = 23
 MAP_HEIGHT = 21
@@ -33,45 +34,29 @@ debug = False
 if debug and debug != 'AG':
     from debugging import *
 
-DIRECTIONS_EVEN = ((1, 0),
-                   (0, -1),
-                   (-1, -1),
-                   (-1, 0),
-                   (-1, 1),
-                   (0, 1))
-DIRECTIONS_ODD = ((1, 0),
-                  (1, -1),
-                  (0, -1),
-                  (-1, 0),
-                  (0, 1),
-                  (1, 1))
-
-
-@lru_cache(2 ** 11)
-def neighbor(x, y, o):
-    if y % 2 == 0:
-        dx, dy = DIRECTIONS_EVEN[o]
-    else:
-        dx, dy = DIRECTIONS_ODD[o]
-
-    return Coord(dx + x, dy + y)
-
 
-def is_inside_map(point):
-    return 0 <= point.x <= 22 and 0 <= point.y <= 20
+def mask_of_cells(cells):
+    mask = 0
+    for cell in cells:
+        mask |= CELL_BITS[cell]
+    return mask
 
 
-@lru_cache(2 ** 14)
-def distance_to(ax, ay, bx, by):
-    if ax < bx:
-        return distance_to(bx, by, ax, ay)
+def mask_of(entities):
+    return mask_of_cells(e.pos for e in entities)
 
-    magic = ax - bx + (by - ay + ((ay & 1) - (by & 1))) / 2
 
-    return (abs(magic) + abs(magic + ay - by) + abs(ay - by)) / 2
-
-
-Coord = namedtuple('P', ['x', 'y'], verbose=False)
+# Kinds of the entries of the journal of update(record=True). An entry is its
+# fields then its kind, flat in the journal list so that nothing is allocated,
+# and undo() plays them backwards down to the JOURNAL_TURN that starts the turn.
+JOURNAL_TURN = 0  # my_ship_count, entity_hash, the 4 bitboards, the explosions
+JOURNAL_SET = 1  # ship, attribute name, value (the cooldowns)
+JOURNAL_SHIP = 2  # ship, pos, ori, speed, health
+JOURNAL_TICK = 3  # the cannon balls, whose timers went down by one
+JOURNAL_PUT = 4  # dict, key, value: popped from barrel_at or mine_at (or replaced)
+JOURNAL_DEL = 5  # dict, key: added to barrel_at or mine_at
+JOURNAL_POP = 6  # list: an item was appended
+JOURNAL_INSERT = 7  # list, index, item: an item was deleted
 
 
 class EntityType:
@@ -82,11 +67,13 @@ class EntityType:
 
 
 class Mine:
-    def __init__(self, x, y):
-        self.pos = Coord(x, y)
+    __slots__ = ('pos',)
+
+    def __init__(self, pos):
+        self.pos = pos
 
     def __repr__(self):
-        return 'M({}, {})'.format(self.pos.x, self.pos.y)
+        return 'M({}, {})'.format(CELL_X[self.pos], CELL_Y[self.pos])
 
     def explode(self, ships, force):
         victim = None
@@ -99,53 +86,57 @@ class Mine:
                 victim = ship
 
         if force or victim is not None:
+            near = NEAR_MASKS[self.pos]
 
             for ship in ships:
                 if ship != victim:
-                    if distance_to(self.pos.x, self.pos.y, ship.stern.x, ship.stern.y) <= 1 \
-                            or distance_to(ship.bow.x, ship.bow.y, self.pos.x, self.pos.y) <= 1 \
-                            or distance_to(ship.pos.x, ship.pos.y, self.pos.x, self.pos.y) <= 1:
+                    if near & HULLS[6 * ship.pos + ship.ori]:
                         ship.damage(NEAR_MINE_DAMAGE)
                         exploded = True
 
         return exploded
 
     def copy(self):
-        return Mine(self.pos.x, self.pos.y)
+        return Mine(self.pos)
 
 
 class CannonBall:
-    def __init__(self, x, y, remaining_turns):
-        self.pos = Coord(x, y)
+    __slots__ = ('pos', 'remaining_turns')
+
+    def __init__(self, pos, remaining_turns):
+        self.pos = pos
         self.remaining_turns = remaining_turns
 
     def __repr__(self):
-        return 'CB({}, {}, r{})'.format(self.pos.x, self.pos.y, self.remaining_turns)
+        return 'CB({}, {}, r{})'.format(CELL_X[self.pos], CELL_Y[self.pos], self.remaining_turns)
 
     def copy(self):
-        return CannonBall(self.pos.x, self.pos.y, self.remaining_turns)
+        return CannonBall(self.pos, self.remaining_turns)
 
 
 class RumBarrel:
-    def __init__(self, x, y, health):
-        self.pos = Coord(x, y)
+    __slots__ = ('pos', 'health')
+
+    def __init__(self, pos, health):
+        self.pos = pos
         self.health = health
 
     def __repr__(self):
-        return 'R({}, {}, h{})'.format(self.pos.x, self.pos.y, self.health)
+        return 'R({}, {}, h{})'.format(CELL_X[self.pos], CELL_Y[self.pos], self.health)
 
     def copy(self):
-        return RumBarrel(self.pos.x, self.pos.y, self.health)
+        return RumBarrel(self.pos, self.health)
 
 
 class Action:
-    WAIT = 'W'
-    FASTER = 'F'
-    SLOWER = 'S'
-    GAUCHE = 'G'
-    DROITE = 'D'
-    FIRE = 'B'
-    MINE = 'M'
+    # small ints, so that they index tables (and are the codes of referee_vector)
+    WAIT = 0
+    FASTER = 1
+    SLOWER = 2
+    GAUCHE = 3
+    DROITE = 4
+    FIRE = 5
+    MINE = 6
 
     TRAD = {
         WAIT: "WAIT",
@@ -162,11 +153,96 @@ class Action:
         return Action.TRAD[action]
 
 
+# A move is an action and its target packed in one int: action | target << 3,
+# the target is only kept for FIRE. Lists of moves fit in array('H') or numpy
+# buffers, see World.set_moves and rollout.
+MOVE_BITS = 3
+MOVE_ACTION = 7
+
+
+def pack_move(action, target=None):
+    if action == Action.FIRE:
+        return action | target << MOVE_BITS
+    return action
+
+
+def pack_moves(moves):
+    # packed moves or (action, target) tuples, all packed
+    return [move if move.__class__ is not tuple else pack_move(*move) for move in moves]
+
+
+def unpack_move(move):
+    action = move & MOVE_ACTION
+    return action, move >> MOVE_BITS if action == Action.FIRE else None
+
+
+# speed and orientation after an action in apply_actions, by 3 * action + speed
+# and 6 * action + orientation, for WAIT .. DROITE
+NEW_SPEED = [min(MAX_SHIP_SPEED, max(0, _s + (1 if _a == Action.FASTER else -1 if _a == Action.SLOWER else 0)))
+             for _a in range(Action.FIRE) for _s in range(MAX_SHIP_SPEED + 1)]
+NEW_ORI = [(_o + (1 if _a == Action.GAUCHE else 5 if _a == Action.DROITE else 0)) % 6
+           for _a in range(Action.FIRE) for _o in range(6)]
+
+
+# Where a ship at speed s ends its move, by 3 * pose + s: END_POSES and
+# END_SPEEDS when it hits nothing, and SWEEPS the cells its hull goes through.
+END_POSES = []
+END_SPEEDS = []
+SWEEPS = []
+for _pose in range(POSES):
+    for _speed in range(MAX_SHIP_SPEED + 1):
+        _end, _sweep = _pose, HULLS[_pose]
+        for _i in range(1, _speed + 1):
+            if STEPS[_end] < 0:
+                _speed = 0
+                break
+            _end = 6 * STEPS[_end] + _pose % 6
+            _sweep |= HULLS[_end]
+        END_POSES.append(_end)
+        END_SPEEDS.append(_speed)
+        SWEEPS.append(_sweep)
+
+
+# Cannon balls: TRAVEL_TIMES[distance] is the travel time of a shot, and for a
+# bow cell, FIRE_TARGETS[FIRE_TIMES * bow + t] the cells in range it can hit in
+# exactly t turns, FIRE_MASKS the same as a bitboard. A ball with travel time t
+# explodes at the end of the t-th update after the one that fires it, so
+#   FIRE_MASKS[FIRE_TIMES * ship.bow + t] & HULLS[enemy pose in t turns]
+# are the cells that hit it.
+TRAVEL_TIMES = [int(1 + round(_d / 3)) for _d in range(256)]
+FIRE_TIMES = TRAVEL_TIMES[FIRE_DISTANCE_MAX] + 1
+FIRE_TARGETS = []
+for _bow in range(CELLS + 1):
+    _targets = [[] for _ in range(FIRE_TIMES)]
+    for _cell, _d in enumerate(DISTANCES[_bow][:MAP_CELLS]):
+        if _d <= FIRE_DISTANCE_MAX:
+            _targets[TRAVEL_TIMES[_d]].append(_cell)
+    FIRE_TARGETS.extend(tuple(_t) for _t in _targets)
+FIRE_MASKS = [mask_of_cells(_targets) for _targets in FIRE_TARGETS]
+# every cell in range of a bow
+FIRE_RANGES = [mask_of_cells(_c for _t in FIRE_TARGETS[FIRE_TIMES * _bow:FIRE_TIMES * (_bow + 1)] for _c in _t)
+               for _bow in range(CELLS + 1)]
+
+
+def fire_targets(bow, turns, mask):
+    # the cells of mask that a ship with this bow can hit in exactly `turns` turns
+    hits = FIRE_MASKS[FIRE_TIMES * bow + turns] & mask if 0 < turns < FIRE_TIMES else 0
+    cells = []
+    while hits:
+        bit = hits & -hits
+        hits ^= bit
+        cells.append(bit.bit_length() - 1)
+    return cells
+
+
 class Ship:
-    def __init__(self, x, y, ori, owner, speed=0, health=INITIAL_SHIP_HEALTH):
-        self.pos = Coord(x, y)
-        self.stern = neighbor(x, y, (ori + 3) % 6)
-        self.bow = neighbor(x, y, ori)
+    __slots__ = ('pos', 'stern', 'bow', 'ori', 'speed', 'health', 'owner', 'action', 'target', 'initial_health',
+                 'new_ori', 'mine_cooldown', 'canon_cooldown', 'new_pos_coord', 'new_bow_coord', 'new_stern_coord')
+
+    def __init__(self, pos, ori, owner, speed=0, health=INITIAL_SHIP_HEALTH):
+        self.pos = pos
+        self.stern = NEIGHBORS[6 * pos + (ori + 3) % 6]
+        self.bow = NEIGHBORS[6 * pos + ori]
 
         self.ori = ori
         self.speed = speed
@@ -174,7 +250,7 @@ class Ship:
         self.owner = owner
 
         self.action = None
-        self.target = Coord(-1, -1)
+        self.target = OFF_MAP
         self.initial_health = 0
         self.new_ori = 0
         self.mine_cooldown = 0
@@ -184,7 +260,7 @@ class Ship:
         self.new_stern_coord = None
 
     def __repr__(self):
-        r = 'Ship({}, speed: {}, ori: {}, rhum: {}'.format(str(self.pos), self.speed, self.ori, self.health)
+        r = 'Ship({}, speed: {}, ori: {}, rhum: {}'.format(to_coord(self.pos), self.speed, self.ori, self.health)
         r += ' action: {}, new_ori: {}, new_pos: {}, new_bow: {}, new_stern: {}'.format(self.action,
                                                                                         self.new_ori,
                                                                                         self.new_pos_coord,
@@ -194,10 +270,28 @@ class Ship:
         return r
 
     def copy(self):
-        return Ship(self.pos.x, self.pos.y, self.ori, self.owner, self.speed, self.health)
-
-    def at(self, coord):
-        return self.bow == coord or self.stern == coord or self.pos == coord
+        # raw copy of every field: no geometry recomputed and the cooldowns are kept
+        ship = Ship.__new__(Ship)
+        ship.pos = self.pos
+        ship.stern = self.stern
+        ship.bow = self.bow
+        ship.ori = self.ori
+        ship.speed = self.speed
+        ship.health = self.health
+        ship.owner = self.owner
+        ship.action = self.action
+        ship.target = self.target
+        ship.initial_health = self.initial_health
+        ship.new_ori = self.new_ori
+        ship.mine_cooldown = self.mine_cooldown
+        ship.canon_cooldown = self.canon_cooldown
+        ship.new_pos_coord = self.new_pos_coord
+        ship.new_bow_coord = self.new_bow_coord
+        ship.new_stern_coord = self.new_stern_coord
+        return ship
+
+    def at(self, cell):
+        return self.bow == cell or self.stern == cell or self.pos == cell
 
     def new_bow_intersect(self, ships):
         for ship in ships:
@@ -227,16 +321,70 @@ class Ship:
 
 
 class World:
+    __slots__ = ('my_ship_count', 'barrel_at', 'cannon_balls', 'mine_at', 'my_ships', 'enemy_ships',
+                 'cannon_ball_explosions', 'barrel_mask', 'mine_mask', 'explosion_mask', 'ship_mask', 'journal',
+                 'log', 'entity_hash')
+
     def __init__(self, my_ship_count, barrels, cannon_balls, mines, my_ships, enemy_ships):
         self.my_ship_count = my_ship_count
-        self.barrels = barrels
+        # cell -> entity, there is at most one barrel and one mine per cell
+        self.barrel_at = {barrel.pos: barrel for barrel in barrels}
         self.cannon_balls = cannon_balls
-        self.mines = mines
+        self.mine_at = {mine.pos: mine for mine in mines}
         self.my_ships = my_ships
         self.enemy_ships = enemy_ships
 
         self.cannon_ball_explosions = []
 
+        # bitboards of the cells used by each kind of entity
+        self.barrel_mask = mask_of(barrels)
+        self.mine_mask = mask_of(mines)
+        self.explosion_mask = 0
+        self.ship_mask = 0
+        self.update_ship_mask()
+
+        # Zobrist hash of the mines, barrels and cannon balls, kept up to date
+        # by XORs where they change. The ships move in every phase, so their
+        # part is only added when World.hash is read.
+        self.entity_hash = 0
+        for mine in mines:
+            self.entity_hash ^= MINE_KEYS[mine.pos]
+        for barrel in barrels:
+            self.entity_hash ^= barrel_key(barrel)
+        for ball in cannon_balls:
+            self.entity_hash ^= ball_key(ball)
+
+        # the changes of the turns played with update(record=True), see undo(),
+        # and log is the journal while such a turn is played
+        self.journal = []
+        self.log = None
+
+    @property
+    def barrels(self):
+        return list(self.barrel_at.values())
+
+    @property
+    def mines(self):
+        return list(self.mine_at.values())
+
+    def update_ship_mask(self):
+        mask = 0
+        for ship in self.my_ships + self.enemy_ships:
+            mask |= HULLS[6 * ship.pos + ship.ori]
+        self.ship_mask = mask
+
+    @property
+    def hash(self):
+        return self.entity_hash ^ self.ships_hash()
+
+    def ships_hash(self):
+        h = 0
+        for i, ship in enumerate(self.my_ships):
+            h ^= ship_key(i, ship)
+        for i, ship in enumerate(self.enemy_ships):
+            h ^= ship_key(MAX_SHIPS + i, ship)
+        return h
+
     def pretty(self):
         return {
             "Barrels :": self.barrels,
@@ -247,12 +395,33 @@ class World:
         }
 
     def copy(self):
-        return World(self.my_ship_count,
-                     [b.copy() for b in self.barrels],
-                     [b.copy() for b in self.cannon_balls],
-                     [m.copy() for m in self.mines],
-                     [s.copy() for s in self.my_ships],
-                     [s.copy() for s in self.enemy_ships])
+        # same as World(...) but reuses the bitboards instead of rebuilding them.
+        # Barrels and mines are never modified once created, so they are shared.
+        world = World.__new__(World)
+        world.my_ship_count = self.my_ship_count
+        world.barrel_at = self.barrel_at.copy()
+        world.cannon_balls = [b.copy() for b in self.cannon_balls]
+        world.mine_at = self.mine_at.copy()
+        world.my_ships = [s.copy() for s in self.my_ships]
+        world.enemy_ships = [s.copy() for s in self.enemy_ships]
+        world.cannon_ball_explosions = []
+
+        world.barrel_mask = self.barrel_mask
+        world.mine_mask = self.mine_mask
+        world.explosion_mask = 0
+        world.ship_mask = self.ship_mask
+        world.journal = []
+        world.log = None
+        world.entity_hash = self.entity_hash
+        return world
+
+    def mirror(self):
+        # a copy of the world as seen by the other player, the ships keep their
+        # owner: a bot playing both sides in one process tells them apart with it
+        world = self.copy()
+        world.my_ships, world.enemy_ships = world.enemy_ships, world.my_ships
+        world.my_ship_count = len(world.my_ships)
+        return world
 
     def ships(self):
         return self.my_ships + self.enemy_ships
@@ -264,30 +433,104 @@ class World:
             ships = self.enemy_ships
         assert len(ships) == len(actions)
 
-        for i, (action, target) in enumerate(actions):
-            ship = ships[i]
-
-            if action == Action.FASTER:
-                ship.action = Action.FASTER
-            elif action == Action.SLOWER:
-                ship.action = Action.SLOWER
-            elif action == Action.GAUCHE:
-                ship.action = Action.GAUCHE
-            elif action == Action.DROITE:
-                ship.action = Action.DROITE
-            elif action == Action.MINE:
-                if MINES_ENABLED:
-                    ship.action = Action.MINE
-            elif action == Action.WAIT:
-                pass
-            elif action == Action.FIRE:
+        for ship, (action, target) in zip(ships, actions):
+            if action not in Action.TRAD:
+                raise ValueError(action)
+            if action == Action.FIRE:
                 ship.target = target
-                ship.action = Action.FIRE
-            else:
-                raise ValueError
+            elif action == Action.MINE and not MINES_ENABLED:
+                continue
+            ship.action = action
+
+    def set_moves(self, guy, moves):
+        # like set_actions with packed moves (see pack_move)
+        if guy:
+            ships = self.my_ships
+        else:
+            ships = self.enemy_ships
+        assert len(ships) == len(moves)
+
+        for ship, move in zip(ships, moves):
+            action = move & MOVE_ACTION
+            if action > Action.MINE:
+                raise ValueError(move)
+            if action == Action.FIRE:
+                target = move >> MOVE_BITS
+                if target > OFF_MAP:
+                    raise ValueError(move)
+                ship.target = target
+            elif action == Action.MINE and not MINES_ENABLED:
+                continue
+            ship.action = action
+
+    def moves(self, ship, enemies=None, targets=None):
+        # The legal packed moves of a ship, each one giving a different world:
+        # FASTER and SLOWER only when they change the speed and the move (not
+        # against the edge of the map), MINE and FIRE only when something is
+        # dropped or fired (the cooldowns go down before the actions are applied,
+        # hence <= 1). Shots go to the cells of the bitboard `targets` in range,
+        # by default to the cells where the enemies' hulls are when the ball
+        # lands if they keep going straight. Lazy, stop when you have enough.
+        yield Action.WAIT
+        i = 18 * ship.pos + 3 * ship.ori + ship.speed
+        if ship.speed < MAX_SHIP_SPEED and (END_POSES[i + 1] != END_POSES[i] or END_SPEEDS[i + 1] != END_SPEEDS[i]):
+            yield Action.FASTER
+        if ship.speed > 0 and (END_POSES[i - 1] != END_POSES[i] or END_SPEEDS[i - 1] != END_SPEEDS[i]):
+            yield Action.SLOWER
+        yield Action.GAUCHE
+        yield Action.DROITE
+
+        if MINES_ENABLED and ship.mine_cooldown <= 1:
+            target = NEIGHBORS[6 * ship.stern + (ship.ori + 3) % 6]
+            if target < MAP_CELLS and not (self.barrel_mask | self.mine_mask | self.ship_mask) & CELL_BITS[target]:
+                yield Action.MINE
+
+        if not CANNONS_ENABLED or ship.canon_cooldown > 1:
+            return
+        bow = ship.bow
+        if targets is None:
+            if enemies is None:
+                enemies = self.my_ships if any(s is ship for s in self.enemy_ships) else self.enemy_ships
+            # a ball with travel time t lands after t + 1 moves of the enemy
+            targets = 0
+            for enemy in enemies:
+                pose, speed = 6 * enemy.pos + enemy.ori, enemy.speed
+                for t in range(FIRE_TIMES):
+                    i = 3 * pose + speed
+                    pose, speed = END_POSES[i], END_SPEEDS[i]
+                    if t:
+                        targets |= FIRE_MASKS[FIRE_TIMES * bow + t] & HULLS[pose]
+        hits = targets & FIRE_RANGES[bow]
+        while hits:
+            bit = hits & -hits
+            hits ^= bit
+            yield Action.FIRE | (bit.bit_length() - 1) << MOVE_BITS
+
+    def branching(self):
+        # effective branching factor: the moves of each ship (mine then the
+        # enemies) and the joint moves of a turn, next to the naive count of the
+        # seven actions with a shot at every cell in range
+        moves = [sum(1 for _ in self.moves(ship)) for ship in self.my_ships + self.enemy_ships]
+        naive = [Action.MINE + bin(FIRE_RANGES[ship.bow]).count('1') for ship in self.my_ships + self.enemy_ships]
+        joint = naive_joint = 1
+        for n, m in zip(moves, naive):
+            joint *= n
+            naive_joint *= m
+        return {
+            'moves': moves,
+            'naive': naive,
+            'joint': joint,
+            'naive_joint': naive_joint,
+            'reduction': naive_joint / joint if joint else 0,
+        }
 
     def decrement_rhum(self):
+        log = self.log
         for ship in self.my_ships + self.enemy_ships:
+            if log is not None:
+                # every ship loses rum, and most move or turn: the first change
+                # of these fields in the turn, the others need no entry
+                log.extend((ship, ship.pos, ship.ori, ship.speed, ship.health, JOURNAL_SHIP))
             ship.damage(1)
 
     def update_initial_rum(self):
@@ -295,86 +538,126 @@ class World:
             ship.initial_health = ship.health
 
     def move_cannonbals(self):
+        log = self.log
         to_del = []
         for i, ball in enumerate(self.cannon_balls):
             if ball.remaining_turns == 0:
                 to_del.append(i)
+                self.entity_hash ^= ball_key(ball)
                 continue
 
             elif ball.remaining_turns > 0:
+                self.entity_hash ^= ball_key(ball)
                 ball.remaining_turns -= 1
+                self.entity_hash ^= ball_key(ball)
 
             if ball.remaining_turns == 0:
                 self.cannon_ball_explosions.append(ball.pos)
+                self.explosion_mask |= CELL_BITS[ball.pos]
 
         for i, key in enumerate(to_del):
+            if log is not None:
+                log.extend((self.cannon_balls, key - i, self.cannon_balls[key - i], JOURNAL_INSERT))
             del self.cannon_balls[key - i]
+        if log is not None and self.cannon_balls:
+            # after the deletions, so undo puts back the balls of 0 turns after the others went up
+            log.extend((self.cannon_balls, JOURNAL_TICK))
 
     def apply_actions(self):
+        log = self.log
         for ship in self.my_ships + self.enemy_ships:
+            if log is not None:
+                # the cooldowns that go down, or that the action may set
+                if ship.mine_cooldown > 0 or ship.action == Action.MINE:
+                    log.extend((ship, 'mine_cooldown', ship.mine_cooldown, JOURNAL_SET))
+                if ship.canon_cooldown > 0 or ship.action == Action.FIRE:
+                    log.extend((ship, 'canon_cooldown', ship.canon_cooldown, JOURNAL_SET))
             if ship.mine_cooldown > 0:
                 ship.mine_cooldown -= 1
             if ship.canon_cooldown > 0:
                 ship.canon_cooldown -= 1
             ship.new_ori = ship.ori
 
-            if ship.action is not None:
-                if ship.action == Action.FASTER:
-                    ship.speed = min(MAX_SHIP_SPEED, ship.speed + 1)
-                elif ship.action == Action.SLOWER:
-                    ship.speed = max(0, ship.speed - 1)
-                elif ship.action == Action.GAUCHE:
-                    ship.new_ori = (ship.ori + 1) % 6
-                elif ship.action == Action.DROITE:
-                    ship.new_ori = (ship.ori + 5) % 6
-                elif ship.action == Action.MINE:
+            action = ship.action
+            if action is not None:
+                if action < Action.FIRE:
+                    ship.speed = NEW_SPEED[3 * action + ship.speed]
+                    ship.new_ori = NEW_ORI[6 * action + ship.ori]
+                elif action == Action.MINE:
                     if ship.mine_cooldown == 0:
-                        target = neighbor(ship.stern.x, ship.stern.y, (ship.ori + 3) % 6)
-
-                        if is_inside_map(target):
-                            cell_free_of_barrels = all(bar.pos != target for bar in self.barrels)
-                            cell_free_of_mines = all(bar.pos != target for bar in self.mines)
-                            cell_free_of_ships = True
-                            for s in self.my_ships + self.enemy_ships:
-                                if s != ship:
-                                    if s.bow == target or s.stern == target or s.pos == target:
-                                        cell_free_of_ships = False
-                                        break
-
-                            if cell_free_of_barrels and cell_free_of_mines and cell_free_of_ships:
-                                ship.mine_cooldown = COOLDOWN_MINE
-                                mine = Mine(target.x, target.y)
-                                self.mines.append(mine)
-                elif ship.action == Action.FIRE:
-                    dist = distance_to(ship.bow.x, ship.bow.y, ship.target.x, ship.target.y)
-                    travel_time = int(1 + round(dist / 3))
-                    self.cannon_balls.append(CannonBall(ship.target.x, ship.target.y, travel_time))
+                        target = NEIGHBORS[6 * ship.stern + (ship.ori + 3) % 6]
+
+                        # the target is behind the stern, so never a cell of the ship itself
+                        used = self.barrel_mask | self.mine_mask | self.ship_mask
+                        if target < MAP_CELLS and not used & CELL_BITS[target]:
+                            ship.mine_cooldown = COOLDOWN_MINE
+                            if log is not None:
+                                log.extend((self.mine_at, target, JOURNAL_DEL))
+                            self.mine_at[target] = Mine(target)
+                            self.mine_mask |= CELL_BITS[target]
+                            self.entity_hash ^= MINE_KEYS[target]
+                else:
+                    # like the game, a shot out of the map, out of range or during the cooldown does nothing
+                    target = ship.target
+                    distance = DISTANCES[ship.bow][target]
+                    if ship.canon_cooldown == 0 and target < MAP_CELLS and distance <= FIRE_DISTANCE_MAX:
+                        ship.canon_cooldown = COOLDOWN_CANNON
+                        ball = CannonBall(target, TRAVEL_TIMES[distance])
+                        if log is not None:
+                            log.extend((self.cannon_balls, JOURNAL_POP))
+                        self.cannon_balls.append(ball)
+                        self.entity_hash ^= ball_key(ball)
 
     def check_all_collisions(self):
-        for ship in self.my_ships + self.enemy_ships:
-
-            to_del = []
-            for i, barrel in enumerate(self.barrels):
-                if ship.bow == barrel.pos or ship.stern == barrel.pos:  # ship.pos == barrel.pos is impossible
-                    ship.heal(barrel.health)
-                    to_del.append(i)
-
-            for nb_deleted, key in enumerate(to_del):
-                del self.barrels[key - nb_deleted]
-
-        to_del = []
-        for nb_deleted, mine in enumerate(self.mines):
-            mine_damages = mine.explode(self.my_ships + self.enemy_ships, False)
+        if self.barrel_mask & self.ship_mask:
+            for ship in self.my_ships + self.enemy_ships:
+                for cell in (ship.bow, ship.stern):  # ship.pos == barrel.pos is impossible
+                    if self.barrel_mask & CELL_BITS[cell]:
+                        barrel = self.barrel_at.pop(cell)
+                        if self.log is not None:
+                            self.log.extend((self.barrel_at, cell, barrel, JOURNAL_PUT))
+                        ship.heal(barrel.health)
+                        self.barrel_mask &= ~CELL_BITS[cell]
+                        self.entity_hash ^= barrel_key(barrel)
+
+        hits = self.mine_mask & self.ship_mask
+        while hits:
+            bit = hits & -hits
+            hits ^= bit
+            cell = bit.bit_length() - 1
+
+            # a ship is on it, so it always explodes
+            mine = self.mine_at.pop(cell)
+            if self.log is not None:
+                self.log.extend((self.mine_at, cell, mine, JOURNAL_PUT))
+            mine.explode(self.my_ships + self.enemy_ships, False)
+            self.mine_mask ^= bit
+            self.entity_hash ^= MINE_KEYS[cell]
 
-            if mine_damages:
-                to_del.append(nb_deleted)
+    def move_ships(self):
+        ships = self.my_ships + self.enemy_ships
 
-        for nb_deleted, key in enumerate(to_del):
-            del self.mines[key - nb_deleted]
+        # Usually no ship can meet another one, a barrel or a mine during its
+        # move, then they all go straight to the end of it.
+        used = self.barrel_mask | self.mine_mask
+        for ship in ships:
+            sweep = SWEEPS[18 * ship.pos + 3 * ship.ori + ship.speed]
+            if sweep & used:
+                break
+            used |= sweep
+        else:
+            for ship in ships:
+                move = 18 * ship.pos + 3 * ship.ori + ship.speed
+                pose = END_POSES[move]
+                ship.speed = END_SPEEDS[move]
+                ship.pos = ship.new_pos_coord = pose // 6
+                ship.bow = ship.new_bow_coord = NEIGHBORS[pose]
+                ship.stern = ship.new_stern_coord = STERNS[pose]
+            self.update_ship_mask()
+            return
 
-    def move_ships(self):
         for i in range(1, MAX_SHIP_SPEED + 1):
-            for ship in self.my_ships + self.enemy_ships:
+            for ship in ships:
 
                 ship.new_pos_coord = ship.pos
                 ship.new_bow_coord = ship.bow
@@ -383,12 +666,13 @@ class World:
                 if i > ship.speed:
                     continue
 
-                new_coord = neighbor(ship.pos.x, ship.pos.y, ship.ori)
+                new_coord = STEPS[6 * ship.pos + ship.ori]
 
-                if is_inside_map(new_coord):
+                if new_coord >= 0:
+                    pose = 6 * new_coord + ship.ori
                     ship.new_pos_coord = new_coord
-                    ship.new_bow_coord = neighbor(new_coord.x, new_coord.y, ship.ori)
-                    ship.new_stern_coord = neighbor(new_coord.x, new_coord.y, (ship.ori + 3) % 6)
+                    ship.new_bow_coord = NEIGHBORS[pose]
+                    ship.new_stern_coord = STERNS[pose]
                 else:
                     # stop ship
                     ship.speed = 0
@@ -398,8 +682,8 @@ class World:
             collision_detected = True
             while collision_detected:
                 collision_detected = False
-                for ship in self.my_ships + self.enemy_ships:
-                    if ship.new_bow_intersect(self.my_ships + self.enemy_ships):
+                for ship in ships:
+                    if ship.new_bow_intersect(ships):
                         collisions.append(ship)
 
                 for ship in collisions:
@@ -415,21 +699,30 @@ class World:
                 collisions.clear()
 
             # move ships to their new location
-            for ship in self.my_ships + self.enemy_ships:
+            for ship in ships:
                 ship.pos = ship.new_pos_coord
-                ship.stern = neighbor(ship.pos.x, ship.pos.y, (ship.ori + 3) % 6)
-                ship.bow = neighbor(ship.pos.x, ship.pos.y, ship.ori)
+                ship.bow = ship.new_bow_coord
+                ship.stern = ship.new_stern_coord
+            self.update_ship_mask()
 
             # check mines / rhum
             self.check_all_collisions()
 
     def rotate_ships(self):
+        ships = self.my_ships + self.enemy_ships
 
         # rotate
-        for ship in self.my_ships + self.enemy_ships:
+        turning = False
+        for ship in ships:
+            pose = 6 * ship.pos + ship.new_ori
             ship.new_pos_coord = ship.pos
-            ship.new_bow_coord = neighbor(ship.pos.x, ship.pos.y, ship.new_ori)
-            ship.new_stern_coord = neighbor(ship.pos.x, ship.pos.y, (ship.new_ori + 3) % 6)
+            ship.new_bow_coord = NEIGHBORS[pose]
+            ship.new_stern_coord = STERNS[pose]
+            turning = turning or ship.new_ori != ship.ori
+
+        # nothing changes, and move_ships already checked the mines and barrels
+        if not turning:
+            return
 
         # check collisions
         collision_detected = True
@@ -437,23 +730,24 @@ class World:
         while collision_detected:
             collision_detected = False
 
-            for ship in self.my_ships + self.enemy_ships:
-                if ship.new_pos_intersect(self.my_ships + self.enemy_ships):
+            for ship in ships:
+                if ship.new_pos_intersect(ships):
                     collisions.append(ship)
 
             for ship in collisions:
                 ship.new_ori = ship.ori
-                ship.new_bow_coord = neighbor(ship.pos.x, ship.pos.y, ship.new_ori)
-                ship.new_stern_coord = neighbor(ship.pos.x, ship.pos.y, (ship.new_ori + 3) % 6)
+                ship.new_bow_coord = ship.bow
+                ship.new_stern_coord = ship.stern
                 ship.speed = 0
                 collision_detected = True
             collisions.clear()
 
         # apply rotation
-        for ship in self.my_ships + self.enemy_ships:
+        for ship in ships:
             ship.ori = ship.new_ori
             ship.bow = ship.new_bow_coord
             ship.stern = ship.new_stern_coord
+        self.update_ship_mask()
 
         # check mines / rhum
         self.check_all_collisions()
@@ -462,6 +756,9 @@ class World:
         return not (self.enemy_ships and self.my_ships)
 
     def explode_ships(self):
+        if not self.explosion_mask & self.ship_mask:
+            return
+
         to_del = []
         for i, pos in enumerate(self.cannon_ball_explosions):
             for ship in self.my_ships + self.enemy_ships:
@@ -476,49 +773,108 @@ class World:
 
         for i, key in enumerate(to_del):
             del self.cannon_ball_explosions[key - i]
+        self.explosion_mask = mask_of_cells(self.cannon_ball_explosions)
 
     def explode_mines(self):
+        if not self.explosion_mask & self.mine_mask:
+            return
+
         to_del_booms = []
         for i, pos in enumerate(self.cannon_ball_explosions):
-            boom_mine = None
-            for j, mine in enumerate(self.mines):
-                if pos == mine.pos:
-                    mine.explode(self.my_ships + self.enemy_ships, True)
-                    to_del_booms.append(i)
-                    boom_mine = j
-                    break
-
-            if boom_mine is not None:
-                del self.mines[boom_mine]
+            mine = self.mine_at.pop(pos, None)
+            if mine is not None:
+                if self.log is not None:
+                    self.log.extend((self.mine_at, pos, mine, JOURNAL_PUT))
+                mine.explode(self.my_ships + self.enemy_ships, True)
+                to_del_booms.append(i)
+                self.mine_mask &= ~CELL_BITS[pos]
+                self.entity_hash ^= MINE_KEYS[pos]
 
         for i, key in enumerate(to_del_booms):
-            del self.cannon_balls[key - i]
+            del self.cannon_ball_explosions[key - i]
+        self.explosion_mask = mask_of_cells(self.cannon_ball_explosions)
 
     def explode_barrels(self):
+        if not self.explosion_mask & self.barrel_mask:
+            return
 
         to_del_boom = []
 
         for i, pos in enumerate(self.cannon_ball_explosions):
-            miam_boom = None
-            for j, rum in enumerate(self.barrels):
-                if pos == rum.pos:
-                    to_del_boom.append(i)
-                    miam_boom = j
-                    break
-
-            if miam_boom is not None:
-                del self.barrels[miam_boom]
+            barrel = self.barrel_at.pop(pos, None)
+            if barrel is not None:
+                if self.log is not None:
+                    self.log.extend((self.barrel_at, pos, barrel, JOURNAL_PUT))
+                to_del_boom.append(i)
+                self.barrel_mask &= ~CELL_BITS[pos]
+                self.entity_hash ^= barrel_key(barrel)
 
         for i, key in enumerate(to_del_boom):
             del self.cannon_ball_explosions[key - i]
+        self.explosion_mask = mask_of_cells(self.cannon_ball_explosions)
 
     def prepare(self):
         self.my_ship_count = len(self.my_ships)
         for ship in self.my_ships + self.enemy_ships:
             ship.action = None
         self.cannon_ball_explosions.clear()
+        self.explosion_mask = 0
+
+    def record(self):
+        # starts the journal of a turn, the world-wide fields are saved here and
+        # each phase of update adds what it changes. The ships' actions and
+        # scratch fields (initial_health, new_*) are not kept, every turn sets
+        # them before use.
+        self.journal.extend((self.my_ship_count, self.entity_hash,
+                             self.barrel_mask, self.mine_mask, self.explosion_mask, self.ship_mask,
+                             tuple(self.cannon_ball_explosions), JOURNAL_TURN))
+        self.log = self.journal
+
+    def undo(self):
+        # rewind the last turn played with update(record=True)
+        journal = self.journal
+        pop = journal.pop
+        while True:
+            kind = pop()
+            if kind == JOURNAL_SHIP:
+                ship, pos, ori, ship.speed, ship.health = journal[-5:]
+                del journal[-5:]
+                pose = 6 * pos + ori
+                ship.pos = pos
+                ship.ori = ori
+                ship.bow = NEIGHBORS[pose]
+                ship.stern = STERNS[pose]
+            elif kind == JOURNAL_SET:
+                ship, name, value = journal[-3:]
+                del journal[-3:]
+                setattr(ship, name, value)
+            elif kind == JOURNAL_TICK:
+                for ball in pop():
+                    if ball.remaining_turns >= 0:
+                        ball.remaining_turns += 1
+            elif kind == JOURNAL_PUT:
+                entities, cell, entity = journal[-3:]
+                del journal[-3:]
+                entities[cell] = entity
+            elif kind == JOURNAL_DEL:
+                cell = pop()
+                del pop()[cell]
+            elif kind == JOURNAL_POP:
+                pop().pop()
+            elif kind == JOURNAL_INSERT:
+                items, i, item = journal[-3:]
+                del journal[-3:]
+                items.insert(i, item)
+            else:
+                (self.my_ship_count, self.entity_hash,
+                 self.barrel_mask, self.mine_mask, self.explosion_mask, self.ship_mask, explosions) = journal[-7:]
+                del journal[-7:]
+                self.cannon_ball_explosions[:] = explosions
+                return
 
-    def update(self):
+    def update(self, record=False):
+        if record:
+            self.record()
 
         self.move_cannonbals()
         self.decrement_rhum()
@@ -542,13 +898,25 @@ class World:
                     reward = ship.initial_health
 
                 if reward > 0:
-                    self.barrels.append(RumBarrel(ship.pos.x, ship.pos.y, reward))
+                    if ship.pos in self.barrel_at:
+                        self.entity_hash ^= barrel_key(self.barrel_at[ship.pos])
+                    if self.log is not None:
+                        if ship.pos in self.barrel_at:
+                            self.log.extend((self.barrel_at, ship.pos, self.barrel_at[ship.pos], JOURNAL_PUT))
+                        else:
+                            self.log.extend((self.barrel_at, ship.pos, JOURNAL_DEL))
+                    barrel = RumBarrel(ship.pos, reward)
+                    self.barrel_at[ship.pos] = barrel
+                    self.barrel_mask |= CELL_BITS[ship.pos]
+                    self.entity_hash ^= barrel_key(barrel)
 
         to_del = []
         for i, ship in enumerate(self.my_ships):
             if ship.health <= 0:
                 to_del.append(i)
         for i, key in enumerate(to_del):
+            if self.log is not None:
+                self.log.extend((self.my_ships, key - i, self.my_ships[key - i], JOURNAL_INSERT))
             del self.my_ships[key - i]
 
         to_del.clear()
@@ -556,11 +924,79 @@ class World:
             if ship.health <= 0:
                 to_del.append(i)
         for i, key in enumerate(to_del):
+            if self.log is not None:
+                self.log.extend((self.enemy_ships, key - i, self.enemy_ships[key - i], JOURNAL_INSERT))
             del self.enemy_ships[key - i]
+        self.update_ship_mask()
+        self.log = None
 
         if self.game_is_over():
             return 'Game over'
 
+    def play(self, sides, moves, record=False):
+        # One turn of rollout: moves[k][i] is the (action, target) or packed
+        # move of sides[k][i], missing moves are WAIT. Returns like update.
+        self.my_ship_count = len(self.my_ships)
+        self.cannon_ball_explosions.clear()
+        self.explosion_mask = 0
+
+        for ships, side_moves in zip(sides, moves):
+            for ship in ships:
+                ship.action = None
+            for ship, move in zip(ships, side_moves):
+                if move.__class__ is tuple:
+                    action, target = move
+                else:
+                    action = move & MOVE_ACTION
+                    target = move >> MOVE_BITS
+                if action == Action.FIRE:
+                    ship.target = target
+                elif action == Action.MINE and not MINES_ENABLED:
+                    continue
+                ship.action = action
+
+        return self.update(record)
+
+    def rollout(self, my_plan, enemy_plan, turns=None, score=None, every=1, record=False):
+        # Plays the plans on this world: plan[t][i] is the (action, target) or
+        # the packed move of the i-th ship (as alive now, even if others sink)
+        # at turn t, turns past the end of a plan are WAIT. Same as prepare /
+        # set_actions / update each turn, without the checks and list rebuilding.
+        # Yields score(world) (or the world itself) every `every` turns, after
+        # the last turn and when the game is over.
+        if turns is None:
+            turns = max(len(my_plan), len(enemy_plan))
+
+        sides = (self.my_ships[:], self.enemy_ships[:])
+        for turn in range(turns):
+            over = self.play(sides, (my_plan[turn] if turn < len(my_plan) else (),
+                                     enemy_plan[turn] if turn < len(enemy_plan) else ()), record)
+            if over or (turn + 1) % every == 0 or turn == turns - 1:
+                yield score(self) if score is not None else self
+            if over:
+                return
+
+
+def progress(world):
+    # what next_turn compares: the centers of the ships and all the rum left
+    return ([s.pos for s in world.my_ships], [s.pos for s in world.enemy_ships],
+            sum(s.health for s in world.my_ships + world.enemy_ships) + sum(b.health for b in world.barrels))
+
+
+def next_turn(world, previous):
+    # Whether world can be the turn after the one of progress `previous`, as
+    # seen by the same player: no ship appears or moves more than its speed,
+    # and the rum only goes down (every ship loses one per turn, a sunk one
+    # leaves at most what it had). Bots that keep a searcher from one turn to
+    # the next start a new one when it can't, that is on a new game.
+    if previous is None:
+        return False
+    my_ships, enemy_ships, rum = progress(world)
+    my_before, enemy_before, rum_before = previous
+    return rum < rum_before and all(
+        len(ships) <= len(before) and all(any(DISTANCES[a][b] <= MAX_SHIP_SPEED for b in before) for a in ships)
+        for ships, before in ((my_ships, my_before), (enemy_ships, enemy_before)))
+
 
 def get_world():
     rhum = []
@@ -576,26 +1012,135 @@ def get_world():
     for i in range(entity_count):
         entity_id, entity_type, x, y, arg_1, arg_2, arg_3, arg_4 = input().split()
         entity_id = int(entity_id)
-        x = int(x)
-        y = int(y)
+        pos = cell_of(int(x), int(y))
         arg_1 = int(arg_1)
         arg_2 = int(arg_2)
         arg_3 = int(arg_3)
         arg_4 = int(arg_4)
 
         if entity_type == EntityType.BARREL:
-            rhum.append(RumBarrel(x, y, arg_1))
+            rhum.append(RumBarrel(pos, arg_1))
         elif entity_type == EntityType.CANNONBALL:
-            cannons.append(CannonBall(x, y, arg_2))
+            cannons.append(CannonBall(pos, arg_2))
         elif entity_type == EntityType.MINE:
-            mines.append(Mine(x, y))
+            mines.append(Mine(pos))
         elif entity_type == EntityType.SHIP:
-            ships[arg_4].append(Ship(x, y, arg_1, arg_4, arg_2, arg_3))
+            ships[arg_4].append(Ship(pos, arg_1, arg_4, arg_2, arg_3))
 
     world = World(my_ship_count, rhum, cannons, mines, ships_1, ships_0)
     return world
 
 
+class TurnReader:
+    # Reads each turn into the same World, instead of building a new one like
+    # get_world: entities are kept by entity_id, ships and cannon balls are
+    # updated in place, mines and barrels are only added or removed.
+    # Search code can keep things about an entity in cache(entity_id), it is
+    # dropped when the entity disappears. Play on copies of reader.world, never
+    # on the world itself.
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdin
+        self.world = World(0, [], [], [], [], [])
+        self.entities = {}  # entity_id -> entity
+        self.caches = {}  # entity_id -> dict
+        self.my_ship_ids = []  # entity_id of world.my_ships[i]
+        self.enemy_ship_ids = []
+
+    def cache(self, entity_id):
+        cache = self.caches.get(entity_id)
+        if cache is None:
+            cache = self.caches[entity_id] = {}
+        return cache
+
+    def read(self):
+        readline = self.stream.readline
+        my_ship_count = int(readline())
+        lines = [readline() for _ in range(int(readline()))]
+        return self.update(my_ship_count, lines)
+
+    def update(self, my_ship_count, lines):
+        world = self.world
+        entities = self.entities
+
+        balls_hash = 0
+        for ball in world.cannon_balls:
+            balls_hash ^= ball_key(ball)
+
+        ships = ([], [])
+        ids = ([], [])
+        balls = []
+        seen = set()
+        for line in lines:
+            entity_id, entity_type, x, y, arg_1, arg_2, arg_3, arg_4 = line.split()
+            entity_id = int(entity_id)
+            seen.add(entity_id)
+            entity = entities.get(entity_id)
+
+            if entity_type == EntityType.SHIP:
+                pos = cell_of(int(x), int(y))
+                ori = int(arg_1)
+                owner = int(arg_4)
+                if entity is None:
+                    entity = entities[entity_id] = Ship(pos, ori, owner, int(arg_2), int(arg_3))
+                else:
+                    entity.pos = pos
+                    entity.ori = ori
+                    entity.bow = NEIGHBORS[6 * pos + ori]
+                    entity.stern = NEIGHBORS[6 * pos + (ori + 3) % 6]
+                    entity.speed = int(arg_2)
+                    entity.health = int(arg_3)
+                ships[owner].append(entity)
+                ids[owner].append(entity_id)
+
+            elif entity_type == EntityType.CANNONBALL:
+                if entity is None:
+                    entity = entities[entity_id] = CannonBall(cell_of(int(x), int(y)), int(arg_2))
+                else:
+                    entity.remaining_turns = int(arg_2)
+                balls.append(entity)
+
+            elif entity is None:
+                pos = cell_of(int(x), int(y))
+                if entity_type == EntityType.BARREL:
+                    entity = entities[entity_id] = RumBarrel(pos, int(arg_1))
+                    world.barrel_at[pos] = entity
+                    world.barrel_mask |= CELL_BITS[pos]
+                    world.entity_hash ^= barrel_key(entity)
+                elif entity_type == EntityType.MINE:
+                    entity = entities[entity_id] = Mine(pos)
+                    world.mine_at[pos] = entity
+                    world.mine_mask |= CELL_BITS[pos]
+                    world.entity_hash ^= MINE_KEYS[pos]
+
+        for entity_id in [i for i in entities if i not in seen]:
+            entity = entities.pop(entity_id)
+            self.caches.pop(entity_id, None)
+            if isinstance(entity, RumBarrel) and world.barrel_at.get(entity.pos) is entity:
+                del world.barrel_at[entity.pos]
+                world.barrel_mask &= ~CELL_BITS[entity.pos]
+                world.entity_hash ^= barrel_key(entity)
+            elif isinstance(entity, Mine) and world.mine_at.get(entity.pos) is entity:
+                del world.mine_at[entity.pos]
+                world.mine_mask &= ~CELL_BITS[entity.pos]
+                world.entity_hash ^= MINE_KEYS[entity.pos]
+
+        for ball in balls:
+            balls_hash ^= ball_key(ball)
+        world.entity_hash ^= balls_hash
+
+        world.my_ship_count = my_ship_count
+        world.my_ships = ships[1]
+        world.enemy_ships = ships[0]
+        world.cannon_balls = balls
+        world.cannon_ball_explosions.clear()
+        world.explosion_mask = 0
+        world.journal.clear()
+        world.update_ship_mask()
+        self.my_ship_ids = ids[1]
+        self.enemy_ship_ids = ids[0]
+        return world
+
+
 mode = None
 from random import randrange
 
@@ -612,29 +1157,28 @@ def get_random_world():
     canon_balls = []
     nb_canon_bals = randrange(20)
 
-    used_cases = [[0 for y in range(21)] for x in range(23)]
+    used_cases = [0] * MAP_CELLS
 
     # generate de mémoir ilk
     nb = 0
     while nb < my_ship_count + en_ship_count:
-        ship = Ship(randrange(1, 22), randrange(1, 20), randrange(6), 1, randrange(3), randrange(1, 101))
+        ship = Ship(cell_of(randrange(1, 22), randrange(1, 20)), randrange(6), 1, randrange(3), randrange(1, 101))
 
         # verify if there's something where the ship is
-        bow = neighbor(ship.pos.x, ship.pos.y, ship.ori)
-        stern = neighbor(ship.pos.x, ship.pos.y, (ship.ori + 3) % 6)
-        if used_cases[bow.x][bow.y] or used_cases[ship.pos.x][ship.pos.y] or used_cases[stern.x][stern.y]:
+        if used_cases[ship.bow] or used_cases[ship.pos] or used_cases[ship.stern]:
             # if there can't be a ship here : try another
             continue
 
         # occupy his cases
-        used_cases[bow.x][bow.y] = 1
-        used_cases[ship.pos.x][ship.pos.y] = 1
-        used_cases[stern.x][stern.y] = 1
+        used_cases[ship.bow] = 1
+        used_cases[ship.pos] = 1
+        used_cases[ship.stern] = 1
 
-        # add it
+        # add it, owner 1 for mine and 0 for the enemy's like in the game input
         if nb < my_ship_count:
             my_ships.append(ship)
         else:
+            ship.owner = 0
             en_ships.append(ship)
         nb += 1
 
@@ -643,31 +1187,31 @@ def get_random_world():
     while nb < nb_mines:
 
         # verify case is empty
-        mine = Mine(randrange(23), randrange(21))
-        if used_cases[mine.pos.x][mine.pos.y]:
+        mine = Mine(cell_of(randrange(23), randrange(21)))
+        if used_cases[mine.pos]:
             continue
 
         nb += 1
 
         # add mine and occupy case
-        used_cases[mine.pos.x][mine.pos.y] = 1
+        used_cases[mine.pos] = 1
         mines.append(mine)
 
     nb = 0
     while nb < nb_barrel:
-        rum = RumBarrel(randrange(23), randrange(21), randrange(10, 21))
+        rum = RumBarrel(cell_of(randrange(23), randrange(21)), randrange(10, 21))
 
-        if used_cases[rum.pos.x][rum.pos.y]:
+        if used_cases[rum.pos]:
             continue
 
         nb += 1
 
-        used_cases[rum.pos.x][rum.pos.y] = 1
+        used_cases[rum.pos] = 1
         barrels.append(rum)
 
     nb = 0
     while nb < nb_canon_bals:
-        boom = CannonBall(randrange(23), randrange(21), randrange(5))
+        boom = CannonBall(cell_of(randrange(23), randrange(21)), randrange(5))
 
         nb += 1
 
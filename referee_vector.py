@@ -0,0 +1,440 @@
+import numpy as np
+
+from referee_opti import *
+
+# A VectorWorld holds N independent worlds as structure-of-arrays and advances
+# all of them with one step() call. It follows referee_opti.World.update phase
+# by phase, so world(i) after k steps is the same as the scalar World after k
+# prepare/set_actions/update rounds.
+#
+# Ship slots 0 .. MAX_SHIPS-1 are my ships, the next MAX_SHIPS are the enemies,
+# in the same order as World.my_ships + World.enemy_ships.
+
+SHIP_SLOTS = 2 * MAX_SHIPS
+
+# action codes used by step()
+WAIT, FASTER, SLOWER, PORT, STARBOARD, FIRE, MINE = range(7)
+ACTION_CODES = (Action.WAIT, Action.FASTER, Action.SLOWER, Action.GAUCHE, Action.DROITE, Action.FIRE, Action.MINE)
+CODE_OF_ACTION = {a: i for i, a in enumerate(ACTION_CODES)}
+
+
+def unpack_moves(moves):
+    # an array of packed moves (see pack_move) to the codes and targets of step()
+    codes = moves & MOVE_ACTION
+    return codes, np.where(codes == FIRE, moves >> MOVE_BITS, OFF_MAP)
+
+
+# the topology tables as arrays: V_NEIGHBORS[cell, orientation], V_DISTANCES[a, b]
+V_NEIGHBORS = np.array(NEIGHBORS).reshape(-1, 6)
+V_DISTANCES = np.frombuffer(b''.join(DISTANCES), np.uint8).reshape(len(DISTANCES), -1).astype(int)
+V_TRAVEL_TIMES = np.array(TRAVEL_TIMES)
+
+SHIPS_FIELDS = ('spos', 'sori', 'sspeed', 'shealth', 'sowner', 'smine_cooldown', 'scanon_cooldown')
+POOLS = {
+    'barrels': ('balive', ('bpos', 'bhealth')),
+    'mines': ('malive', ('mpos',)),
+    'balls': ('calive', ('cpos', 'cturns')),
+}
+
+
+def _rank(cells, alive):
+    # number of alive entries before each one that share its cell
+    same = (cells[:, :, None] == cells[:, None, :]) & alive[:, :, None] & alive[:, None, :]
+    before = np.tri(cells.shape[1], k=-1, dtype=bool)
+    return (same & before).sum(2)
+
+
+def _match(a_cells, a_alive, b_cells, b_alive):
+    # The scalar referee pairs the i-th item of `a` with the first remaining
+    # item of `b` on the same cell: on each cell the k-th alive a goes with the
+    # k-th alive b, if there is one. Returns which of `a` and `b` got paired.
+    same = (a_cells[:, :, None] == b_cells[:, None, :]) & a_alive[:, :, None] & b_alive[:, None, :]
+    a_paired = a_alive & (_rank(a_cells, a_alive) < same.sum(2))
+    b_paired = b_alive & (_rank(b_cells, b_alive) < same.sum(1))
+    return a_paired, b_paired
+
+
+class VectorWorld:
+    def __init__(self, n, barrels=32, mines=16, balls=32):
+        self.n = n
+        self.rows = np.arange(n)
+        self.my_ship_count = np.zeros(n, int)
+
+        self.salive = np.zeros((n, SHIP_SLOTS), bool)
+        for name in SHIPS_FIELDS:
+            setattr(self, name, np.zeros((n, SHIP_SLOTS), int))
+
+        for pool, size in (('barrels', barrels), ('mines', mines), ('balls', balls)):
+            alive, fields = POOLS[pool]
+            setattr(self, alive, np.zeros((n, size), bool))
+            for name in fields:
+                setattr(self, name, np.zeros((n, size), int))
+
+    @staticmethod
+    def from_worlds(worlds):
+        worlds = list(worlds)
+        vw = VectorWorld(len(worlds),
+                         max([len(w.barrels) for w in worlds] + [1]) + SHIP_SLOTS,
+                         max([len(w.mines) for w in worlds] + [1]) + SHIP_SLOTS,
+                         max([len(w.cannon_balls) for w in worlds] + [1]) + SHIP_SLOTS)
+
+        for i, world in enumerate(worlds):
+            vw.my_ship_count[i] = world.my_ship_count
+
+            slots = list(enumerate(world.my_ships)) + [(MAX_SHIPS + j, s) for j, s in enumerate(world.enemy_ships)]
+            for slot, ship in slots:
+                vw.salive[i, slot] = True
+                vw.spos[i, slot] = ship.pos
+                vw.sori[i, slot] = ship.ori
+                vw.sspeed[i, slot] = ship.speed
+                vw.shealth[i, slot] = ship.health
+                vw.sowner[i, slot] = ship.owner
+                vw.smine_cooldown[i, slot] = ship.mine_cooldown
+                vw.scanon_cooldown[i, slot] = ship.canon_cooldown
+
+            for j, barrel in enumerate(world.barrels):
+                vw.balive[i, j] = True
+                vw.bpos[i, j] = barrel.pos
+                vw.bhealth[i, j] = barrel.health
+
+            for j, mine in enumerate(world.mines):
+                vw.malive[i, j] = True
+                vw.mpos[i, j] = mine.pos
+
+            for j, ball in enumerate(world.cannon_balls):
+                vw.calive[i, j] = True
+                vw.cpos[i, j] = ball.pos
+                vw.cturns[i, j] = ball.remaining_turns
+
+        return vw
+
+    def world(self, i):
+        ships = []
+        for slot in range(SHIP_SLOTS):
+            if self.salive[i, slot]:
+                ship = Ship(int(self.spos[i, slot]), int(self.sori[i, slot]),
+                            int(self.sowner[i, slot]), int(self.sspeed[i, slot]), int(self.shealth[i, slot]))
+                ship.mine_cooldown = int(self.smine_cooldown[i, slot])
+                ship.canon_cooldown = int(self.scanon_cooldown[i, slot])
+                ships.append((slot, ship))
+
+        return World(int(self.my_ship_count[i]),
+                     [RumBarrel(int(self.bpos[i, j]), int(self.bhealth[i, j])) for j in np.flatnonzero(self.balive[i])],
+                     [CannonBall(int(self.cpos[i, j]), int(self.cturns[i, j])) for j in np.flatnonzero(self.calive[i])],
+                     [Mine(int(self.mpos[i, j])) for j in np.flatnonzero(self.malive[i])],
+                     [ship for slot, ship in ships if slot < MAX_SHIPS],
+                     [ship for slot, ship in ships if slot >= MAX_SHIPS])
+
+    def worlds(self):
+        return [self.world(i) for i in range(self.n)]
+
+    def copy(self):
+        vw = VectorWorld.__new__(VectorWorld)
+        for name, value in self.__dict__.items():
+            setattr(vw, name, value.copy() if isinstance(value, np.ndarray) else value)
+        return vw
+
+    def encode_actions(self, my_actions, enemy_actions):
+        # lists (one per world) of [(action, target)] like for World.set_actions,
+        # the j-th action goes to the j-th ship still alive
+        codes = np.zeros((self.n, SHIP_SLOTS), int)
+        targets = np.full((self.n, SHIP_SLOTS), OFF_MAP)
+
+        for i in range(self.n):
+            for side, actions in ((0, my_actions[i]), (1, enemy_actions[i])):
+                slots = [s for s in range(side * MAX_SHIPS, (side + 1) * MAX_SHIPS) if self.salive[i, s]]
+                assert len(slots) == len(actions)
+
+                for slot, (action, target) in zip(slots, actions):
+                    codes[i, slot] = CODE_OF_ACTION[action]
+                    if action == Action.FIRE:
+                        targets[i, slot] = target
+
+        return codes, targets
+
+    # geometry
+
+    def bows(self):
+        return V_NEIGHBORS[self.spos, self.sori]
+
+    def sterns(self):
+        return V_NEIGHBORS[self.spos, (self.sori + 3) % 6]
+
+    def ship_cells(self):
+        # [world, slot, bow / center / stern]
+        return np.stack((self.bows(), self.spos, self.sterns()), 2)
+
+    def _save(self, rows):
+        # the state of the worlds in `rows`, to put back with _restore
+        return rows, {name: value[rows] for name, value in self.__dict__.items()
+                      if isinstance(value, np.ndarray) and value is not self.rows}
+
+    def _restore(self, saved):
+        rows, values = saved
+        for name, value in values.items():
+            array = getattr(self, name)
+            if array.ndim == 2 and array.shape[1] > value.shape[1]:
+                # the pool grew since: the extra slots are not alive
+                array[rows, value.shape[1]:] = 0
+                array[rows, :value.shape[1]] = value
+            else:
+                array[rows] = value
+
+    def game_over(self):
+        return ~(self.salive[:, :MAX_SHIPS].any(1) & self.salive[:, MAX_SHIPS:].any(1))
+
+    # pools of barrels, mines and cannon balls
+
+    def _push(self, pool, rows, **values):
+        # append one entity at the end of the list of each world in `rows`
+        alive_name, fields = POOLS[pool]
+        if not rows.any():
+            return
+
+        alive = getattr(self, alive_name)
+        size = alive.shape[1]
+        last = size - np.argmax(alive[:, ::-1], 1)
+        last[~alive.any(1)] = 0
+
+        if (last[rows] >= size).any():
+            # squeeze out the holes, keeping the order of each list
+            order = np.argsort(~alive, 1, kind='stable')
+            for name in (alive_name,) + fields:
+                setattr(self, name, np.take_along_axis(getattr(self, name), order, 1))
+            alive = getattr(self, alive_name)
+            last = alive.sum(1)
+
+            if (last[rows] >= size).any():
+                for name in (alive_name,) + fields:
+                    array = getattr(self, name)
+                    setattr(self, name, np.concatenate((array, np.zeros_like(array)), 1))
+                alive = getattr(self, alive_name)
+
+        idx = self.rows[rows]
+        alive[idx, last[rows]] = True
+        for name, value in values.items():
+            getattr(self, name)[idx, last[rows]] = value[rows]
+
+    # phases
+
+    def move_cannonbals(self):
+        self.calive &= self.cturns != 0
+        ticking = self.calive & (self.cturns > 0)
+        self.cturns -= ticking
+
+        exploding = ticking & (self.cturns == 0)
+        columns = exploding.any(0)
+        return self.cpos[:, columns], exploding[:, columns]
+
+    def decrement_rhum(self):
+        self.shealth = np.maximum(self.shealth - self.salive, 0)
+
+    def apply_actions(self, actions, targets):
+        alive = self.salive
+        self.smine_cooldown -= alive & (self.smine_cooldown > 0)
+        self.scanon_cooldown -= alive & (self.scanon_cooldown > 0)
+        actions = np.where(alive, actions, WAIT)
+
+        new_ori = self.sori.copy()
+        self.sspeed = np.where(actions == FASTER, np.minimum(MAX_SHIP_SPEED, self.sspeed + 1), self.sspeed)
+        self.sspeed = np.where(actions == SLOWER, np.maximum(0, self.sspeed - 1), self.sspeed)
+        new_ori = np.where(actions == PORT, (self.sori + 1) % 6, new_ori)
+        new_ori = np.where(actions == STARBOARD, (self.sori + 5) % 6, new_ori)
+
+        ship_cells = self.ship_cells()
+        sterns = self.sterns()
+        bows = self.bows()
+
+        # mines are placed one ship after the other: a mine dropped by a ship
+        # makes the cell busy for the next ones
+        for slot in range(SHIP_SLOTS):
+            if not MINES_ENABLED:
+                break
+            dropping = (actions[:, slot] == MINE) & (self.smine_cooldown[:, slot] == 0)
+            if not dropping.any():
+                continue
+
+            target = V_NEIGHBORS[sterns[:, slot], (self.sori[:, slot] + 3) % 6]
+
+            others = alive.copy()
+            others[:, slot] = False
+            free = (target < MAP_CELLS) \
+                & ~(self.balive & (self.bpos == target[:, None])).any(1) \
+                & ~(self.malive & (self.mpos == target[:, None])).any(1) \
+                & ~(others[:, :, None] & (ship_cells == target[:, None, None])).any((1, 2))
+
+            dropping &= free
+            self.smine_cooldown[dropping, slot] = COOLDOWN_MINE
+            self._push('mines', dropping, mpos=target)
+
+        for slot in range(SHIP_SLOTS):
+            firing = (actions[:, slot] == FIRE) & (self.scanon_cooldown[:, slot] == 0)
+            if not firing.any():
+                continue
+
+            dist = V_DISTANCES[bows[:, slot], targets[:, slot]]
+            firing &= (targets[:, slot] < MAP_CELLS) & (dist <= FIRE_DISTANCE_MAX)
+            travel_time = V_TRAVEL_TIMES[dist]
+            self.scanon_cooldown[firing, slot] = COOLDOWN_CANNON
+            self._push('balls', firing, cpos=targets[:, slot], cturns=travel_time)
+
+        return new_ori
+
+    def mines_damage(self, exploding, force):
+        # damage dealt to each ship by the Mine.explode of the `exploding` mines
+        on = (self.mpos[:, :, None, None] == self.ship_cells()[:, None, :, :]).any(3) & self.salive[:, None, :]
+        has_victim = on.any(2)
+        if not force:
+            exploding = exploding & has_victim
+
+        damage = MINE_DAMAGE * (on & exploding[:, :, None]).sum(1)
+        rows = np.flatnonzero(exploding.any(1))
+        if not len(rows):
+            return damage, exploding
+
+        # splash damage, only in the worlds where something blew up
+        on = on[rows]
+        has_victim = has_victim[rows]
+        victim = SHIP_SLOTS - 1 - np.argmax(on[:, :, ::-1], 2)
+        not_victim = ~(has_victim[:, :, None] & (np.arange(SHIP_SLOTS) == victim[:, :, None]))
+
+        distances = V_DISTANCES[self.mpos[rows]]
+        near = np.zeros(on.shape, bool)
+        for cells in (self.spos, self.bows(), self.sterns()):
+            near |= np.take_along_axis(distances, cells[rows, None, :], 2) <= 1
+        near &= self.salive[rows, None, :] & not_victim & exploding[rows, :, None]
+
+        damage[rows] += NEAR_MINE_DAMAGE * near.sum(1)
+        return damage, exploding
+
+    def check_all_collisions(self):
+        bows = self.bows()
+        sterns = self.sterns()
+
+        for slot in range(SHIP_SLOTS):
+            taken = self.balive & self.salive[:, slot, None] & \
+                ((self.bpos == bows[:, slot, None]) | (self.bpos == sterns[:, slot, None]))
+            heal = (self.bhealth * taken).sum(1)
+            self.shealth[:, slot] = np.minimum(self.shealth[:, slot] + heal, MAX_SHIP_HEALTH)
+            self.balive &= ~taken
+
+        damage, exploded = self.mines_damage(self.malive, False)
+        self.shealth = np.maximum(self.shealth - damage, 0)
+        self.malive &= ~exploded
+
+    def _ships_collide(self, pos, ori, bow_only):
+        # ships whose new cells (bow only for moves) hit another ship's new cells
+        others = self.salive[:, None, :] & self.salive[:, :, None] & ~np.eye(SHIP_SLOTS, dtype=bool)
+        cells = np.stack((V_NEIGHBORS[pos, ori], pos, V_NEIGHBORS[pos, (ori + 3) % 6]), 2)
+
+        mine = cells[:, :, :1] if bow_only else cells
+        hit = mine[:, :, None, :, None] == cells[:, None, :, None, :]
+        return (hit.any((3, 4)) & others).any(2)
+
+    def move_ships(self):
+        for i in range(1, MAX_SHIP_SPEED + 1):
+            moving = self.salive & (i <= self.sspeed)
+            ahead = self.bows()
+            inside = ahead < MAP_CELLS
+
+            self.sspeed[moving & ~inside] = 0
+            new_pos = np.where(moving & inside, ahead, self.spos)
+
+            while True:
+                collisions = self._ships_collide(new_pos, self.sori, True)
+                changes = collisions & ((new_pos != self.spos) | (self.sspeed != 0))
+                if not changes.any():
+                    break
+
+                new_pos = np.where(collisions, self.spos, new_pos)
+                self.sspeed[collisions] = 0
+
+            self.spos = new_pos
+            self.check_all_collisions()
+
+    def rotate_ships(self, new_ori):
+        while True:
+            collisions = self._ships_collide(self.spos, new_ori, False)
+            changes = collisions & ((new_ori != self.sori) | (self.sspeed != 0))
+            if not changes.any():
+                break
+
+            new_ori = np.where(collisions, self.sori, new_ori)
+            self.sspeed[collisions] = 0
+
+        self.sori = new_ori
+        self.check_all_collisions()
+
+    def explode_ships(self, booms, booming):
+        # [world, boom, slot, cell]
+        on = (booms[:, :, None, None] == self.ship_cells()[:, None, :, :]) & self.salive[:, None, :, None]
+        on_ship = on.any(3)
+        hit = booming & on_ship.any(2)
+        first = np.argmax(on_ship, 2)
+
+        side = np.take_along_axis(on[:, :, :, 0] | on[:, :, :, 2], first[:, :, None], 2)[:, :, 0]
+        damage = np.where(side, LOW_DAMAGE, HIGH_DAMAGE) * hit
+        for slot in range(SHIP_SLOTS):
+            self.shealth[:, slot] = np.maximum(self.shealth[:, slot] - (damage * (first == slot)).sum(1), 0)
+
+        return booming & ~hit
+
+    def explode_mines(self, booms, booming):
+        used, exploded = _match(booms, booming, self.mpos, self.malive)
+        damage, exploded = self.mines_damage(exploded, True)
+        self.shealth = np.maximum(self.shealth - damage, 0)
+        self.malive &= ~exploded
+
+        return booming & ~used
+
+    def explode_barrels(self, booms, booming):
+        used, exploded = _match(booms, booming, self.bpos, self.balive)
+        self.balive &= ~exploded
+
+        return booming & ~used
+
+    def step(self, actions, targets=None):
+        if targets is None:
+            targets = np.full(actions.shape, OFF_MAP)
+
+        self.my_ship_count = self.salive[:, :MAX_SHIPS].sum(1)
+
+        booms, booming = self.move_cannonbals()
+        self.decrement_rhum()
+        initial_health = self.shealth.copy()
+
+        new_ori = self.apply_actions(actions, targets)
+        self.move_ships()
+        self.rotate_ships(new_ori)
+
+        if booming.any():
+            booming = self.explode_ships(booms, booming)
+            booming = self.explode_mines(booms, booming)
+            self.explode_barrels(booms, booming)
+
+        # For each sunk ship, create a new rum barrel with the amount of rum
+        # the ship had at the begin of the turn (up to 30).
+        sunk = self.salive & (self.shealth <= 0)
+        reward = np.minimum(initial_health, REWARD_RUM_BARREL_VALUE)
+        for slot in range(SHIP_SLOTS):
+            self._push('barrels', sunk[:, slot] & (reward[:, slot] > 0),
+                       bpos=self.spos[:, slot], bhealth=reward[:, slot])
+
+        self.salive &= ~sunk
+
+        return self.game_over()
+
+    def rollout(self, actions, targets=None, score=None, every=1):
+        # actions and targets of shape (turns, n, 6), like for step().
+        # Yields score(self) (or self) every `every` turns and after the last one.
+        # A world whose game is over (a side without ships) is frozen from then
+        # on, as World.rollout stops there: its balls, mines and rum don't move.
+        turns = len(actions)
+        over = self.game_over()
+        for turn in range(turns):
+            frozen = self._save(over) if over.any() else None
+            over = self.step(actions[turn], None if targets is None else targets[turn])
+            if frozen is not None:
+                self._restore(frozen)
+            if (turn + 1) % every == 0 or turn == turns - 1:
+                yield score(self) if score is not None else self
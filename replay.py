@@ -0,0 +1,246 @@
+import struct
+import sys
+
+import numpy as np
+
+from referee_opti import *
+from referee_vector import SHIP_SLOTS
+
+# Replays: every turn of a game is a fixed-width record (the world before the
+# turn and the moves played from it), and an index at the end of the file gives
+# the first record and the length of each game. Readers memory-map the file:
+# replay[i] and replay.records are numpy records, nothing is built until
+# replay.world(i) is asked for.
+#
+#   with ReplayWriter('games.rpl') as writer:
+#       writer.add(world, my_moves, enemy_moves)  # before each update
+#       writer.end_game()
+#   replay = Replay('games.rpl')
+#   replay.records['ships']['health']  # every turn of every game, no copy
+#   replay.world(replay.games[3]['start'] + 10)  # a World, only now
+#
+# Mines are stored as a bitboard of the cells, ships in slots 0-2 for my ships
+# and 3-5 for the enemies, like in VectorWorld. A mine on OFF_MAP is not kept.
+
+MAGIC = b'CotCrpl1'
+HEADER = struct.Struct('<8sIIQIQ')  # magic, version, record size, records, games, index offset
+VERSION = 1
+
+MAX_BARRELS = 32
+MAX_BALLS = 32
+MINE_BYTES = (CELLS + 7) // 8
+
+SHIP = np.dtype([('pos', '<u2'), ('ori', 'u1'), ('speed', 'u1'), ('health', 'u1'), ('mine_cooldown', 'u1'),
+                 ('canon_cooldown', 'u1'), ('owner', 'u1'), ('move', '<u2')])
+BARREL = np.dtype([('pos', '<u2'), ('health', 'u1')])
+BALL = np.dtype([('pos', '<u2'), ('turns', 'u1')])
+RECORD = np.dtype([('game', '<u4'), ('turn', '<u2'), ('my_ship_count', 'u1'), ('my_ships', 'u1'),
+                   ('enemy_ships', 'u1'), ('barrels', 'u1'), ('balls', 'u1'), ('pad', 'u1'),
+                   ('ships', SHIP, SHIP_SLOTS), ('mines', 'u1', MINE_BYTES),
+                   ('barrel', BARREL, MAX_BARRELS), ('ball', BALL, MAX_BALLS)])
+GAME = np.dtype([('start', '<u8'), ('turns', '<u4'), ('winner', 'i1'), ('pad', 'u1', 3)])
+
+
+def encode(world, my_moves=(), enemy_moves=(), game=0, turn=0):
+    # the record of a world, and the moves played from it
+    record = np.zeros((), RECORD)
+    if len(world.my_ships) > MAX_SHIPS or len(world.enemy_ships) > MAX_SHIPS \
+            or len(world.barrel_at) > MAX_BARRELS or len(world.cannon_balls) > MAX_BALLS:
+        raise ValueError('too many entities for a replay record')
+
+    record['game'] = game
+    record['turn'] = turn
+    record['my_ship_count'] = world.my_ship_count
+    record['my_ships'] = len(world.my_ships)
+    record['enemy_ships'] = len(world.enemy_ships)
+    record['barrels'] = len(world.barrel_at)
+    record['balls'] = len(world.cannon_balls)
+
+    ships = record['ships']
+    for first, side, moves in ((0, world.my_ships, pack_moves(my_moves)),
+                               (MAX_SHIPS, world.enemy_ships, pack_moves(enemy_moves))):
+        for i, ship in enumerate(side):
+            ships[first + i] = (ship.pos, ship.ori, ship.speed, ship.health, ship.mine_cooldown, ship.canon_cooldown,
+                                ship.owner, moves[i] if i < len(moves) else Action.WAIT)
+
+    mines = world.mine_mask & ~CELL_BITS[OFF_MAP]
+    record['mines'] = np.frombuffer(mines.to_bytes(MINE_BYTES, 'little'), np.uint8)
+
+    barrels = record['barrel']
+    for i, barrel in enumerate(world.barrel_at.values()):
+        barrels[i] = (barrel.pos, barrel.health)
+    balls = record['ball']
+    for i, ball in enumerate(world.cannon_balls):
+        balls[i] = (ball.pos, ball.remaining_turns)
+    return record
+
+
+def decode(record):
+    # the World of a record
+    def ships(first, n):
+        out = []
+        for s in record['ships'][first:first + n]:
+            ship = Ship(int(s['pos']), int(s['ori']), int(s['owner']), int(s['speed']), int(s['health']))
+            ship.mine_cooldown = int(s['mine_cooldown'])
+            ship.canon_cooldown = int(s['canon_cooldown'])
+            out.append(ship)
+        return out
+
+    mask = int.from_bytes(record['mines'].tobytes(), 'little')
+    mines = []
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        mines.append(Mine(bit.bit_length() - 1))
+
+    return World(int(record['my_ship_count']),
+                 [RumBarrel(int(b['pos']), int(b['health'])) for b in record['barrel'][:record['barrels']]],
+                 [CannonBall(int(b['pos']), int(b['turns'])) for b in record['ball'][:record['balls']]],
+                 mines,
+                 ships(0, int(record['my_ships'])),
+                 ships(MAX_SHIPS, int(record['enemy_ships'])))
+
+
+def record_moves(record):
+    # (my moves, enemy moves) of a record, packed
+    moves = record['ships']['move']
+    return (tuple(int(m) for m in moves[:record['my_ships']]),
+            tuple(int(m) for m in moves[MAX_SHIPS:MAX_SHIPS + record['enemy_ships']]))
+
+
+class ReplayWriter:
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.itemsize, 0, 0, 0))
+        self.records = 0
+        self.games = []
+        self.start = 0
+
+    def add(self, world, my_moves=(), enemy_moves=()):
+        # the world before a turn, and the moves played from it
+        record = encode(world, my_moves, enemy_moves, len(self.games), self.records - self.start)
+        self.file.write(record.tobytes())
+        self.records += 1
+
+    def end_game(self, winner=None):
+        self.games.append((self.start, self.records - self.start, -1 if winner is None else winner, 0))
+        self.start = self.records
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.records > self.start:
+            self.end_game()
+        index = HEADER.size + self.records * RECORD.itemsize
+        self.file.write(np.array(self.games, GAME).tobytes())
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.itemsize, self.records, len(self.games), index))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Replay:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            magic, version, size, records, games, index = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or size != RECORD.itemsize:
+            raise ValueError('not a replay of this version: ' + path)
+
+        self.records = np.memmap(path, RECORD, 'r', HEADER.size, (records,)) if records \
+            else np.zeros(0, RECORD)
+        self.games = np.memmap(path, GAME, 'r', index, (games,)) if games else np.zeros(0, GAME)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        return self.records[i]
+
+    def game(self, g):
+        # the records of a game
+        start = int(self.games[g]['start'])
+        return self.records[start:start + int(self.games[g]['turns'])]
+
+    def world(self, i):
+        return decode(self.records[i])
+
+    def moves(self, i):
+        return record_moves(self.records[i])
+
+    def chunks(self, size=1 << 16):
+        # streams the records without loading the whole file
+        for start in range(0, len(self.records), size):
+            yield self.records[start:start + size]
+
+    def verify(self, g):
+        # turns of game g after which the referee does not give the next record
+        game = self.game(g)
+        errors = []
+        for t in range(len(game) - 1):
+            world = decode(game[t])
+            my_moves, enemy_moves = record_moves(game[t])
+            world.play((world.my_ships[:], world.enemy_ships[:]), (my_moves, enemy_moves))
+            expected = game[t + 1].copy()
+            got = encode(world, *record_moves(expected), game=expected['game'], turn=expected['turn'])
+            if got.tobytes() != expected.tobytes():
+                errors.append(t)
+        return errors
+
+
+def record_games(path, bots, seeds, max_turns=200):
+    # plays tournament games between two bots and writes them
+    import random
+    from tournament import load_bot
+
+    bots = [load_bot(bot) if isinstance(bot, str) else bot for bot in bots]
+    with ReplayWriter(path) as writer:
+        for seed in seeds:
+            random.seed(seed)
+            world = get_random_world()
+            for _ in range(max_turns):
+                my_moves = bots[0](world.copy())
+                enemy_moves = bots[1](world.mirror())
+                writer.add(world, my_moves, enemy_moves)
+                if world.play((world.my_ships[:], world.enemy_ships[:]), (my_moves, enemy_moves)):
+                    break
+            writer.add(world)
+            writer.end_game(None if world.my_ships and world.enemy_ships else 0 if world.my_ships else 1)
+
+
+def main(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Write, read and check replays.')
+    commands = parser.add_subparsers(dest='command')
+    record = commands.add_parser('record', help="play seeded games between two bots")
+    record.add_argument('path')
+    record.add_argument('bots', nargs=2, help="bots as module:function")
+    record.add_argument('--games', type=int, default=10)
+    record.add_argument('--seed', type=int, default=0)
+    info = commands.add_parser('info', help="games and turns of a replay")
+    info.add_argument('path')
+    verify = commands.add_parser('verify', help="replay every turn with the referee")
+    verify.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        record_games(args.path, args.bots, range(args.seed, args.seed + args.games))
+    elif args.command == 'info':
+        replay = Replay(args.path)
+        print('{} games, {} turns, {} bytes per turn'.format(len(replay.games), len(replay), RECORD.itemsize))
+    elif args.command == 'verify':
+        replay = Replay(args.path)
+        bad = {g: errors for g in range(len(replay.games)) for errors in [replay.verify(g)] if errors}
+        print('{} games, {} with differences {}'.format(len(replay.games), len(bad), bad or ''))
+        sys.exit(1 if bad else 0)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
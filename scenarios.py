@@ -0,0 +1,159 @@
+import random
+import sys
+
+from referee_opti import *
+
+# Seeded worlds, reproducible from their seed:
+#
+#   random_world(seed)  # like get_random_world, any numbers and places
+#   random_world(seed, ships=(3, 3), barrels=26, mines=60, balls=30)
+#   game_world(seed)    # a first turn of the real game, symmetric like input_ex.txt
+#
+# The seed can be an int or a random.Random to draw several worlds from.
+# Places are drawn without replacement and checked against a bitboard of the
+# hulls placed so far, there is no retry loop except for the few ships.
+#
+# A corpus is a replay file with one game of one turn per world, so it is
+# memory-mapped and any world is decoded only when asked for:
+#
+#   python scenarios.py corpus.rpl --count 100000 --kind game
+#   corpus = Replay('corpus.rpl')
+#   corpus.world(i)
+
+# where the middle of a ship can be, with its bow and stern on the map
+SHIP_CELLS = [cell_of(x, y) for y in range(1, MAP_HEIGHT - 1) for x in range(1, MAP_WIDTH - 1)]
+# the cell on the other side of the horizontal axis, where the enemy gets the same entity
+FLIP = [cell_of(CELL_X[cell], MAP_HEIGHT - 1 - CELL_Y[cell]) for cell in range(MAP_CELLS)]
+
+
+ALL_CELLS = list(range(MAP_CELLS))
+
+
+def _rng(seed):
+    return seed if isinstance(seed, random.Random) else random.Random(seed)
+
+
+def _draw(rand, k):
+    # k distinct cells, a partial shuffle (randrange is slow, random() is not)
+    cells = ALL_CELLS[:]
+    for i in range(k):
+        j = i + int(rand() * (MAP_CELLS - i))
+        cells[i], cells[j] = cells[j], cells[i]
+    return cells[:k]
+
+
+def random_world(seed=None, ships=None, barrels=None, mines=None, balls=None, health=(1, 101)):
+    # numbers left to None are drawn like in get_random_world
+    rng = _rng(seed)
+    rand = rng.random
+    if ships is None:
+        ships = (rng.randrange(1, 4), rng.randrange(1, 4))
+    if barrels is None:
+        barrels = rng.randrange(20)
+    if mines is None:
+        mines = rng.randrange(15)
+    if balls is None:
+        balls = rng.randrange(20)
+
+    used = 0
+    sides = ([], [])
+    for side, count in enumerate(ships):
+        while len(sides[side]) < count:
+            pos = SHIP_CELLS[int(rand() * len(SHIP_CELLS))]
+            ori = int(rand() * 6)
+            hull = HULLS[6 * pos + ori]
+            if used & hull:
+                continue
+            used |= hull
+            sides[side].append(Ship(pos, ori, 1 - side, int(rand() * 3),
+                                    health[0] + int(rand() * (health[1] - health[0]))))
+
+    # ships take at most 3 * 2 * MAX_SHIPS cells, the first free cells of a random draw are a random draw too
+    taken = 6 * MAX_SHIPS
+    cells = [cell for cell in _draw(rand, min(barrels + mines + taken, MAP_CELLS))
+             if not used & CELL_BITS[cell]][:barrels + mines]
+    return World(ships[0],
+                 [RumBarrel(cell, 10 + int(rand() * 11)) for cell in cells[:barrels]],
+                 [CannonBall(int(rand() * MAP_CELLS), int(rand() * 5)) for _ in range(balls)],
+                 [Mine(cell) for cell in cells[barrels:]],
+                 *sides)
+
+
+def game_world(seed=None):
+    # the first turn of a game, drawn like the game's referee does: ships in
+    # their own columns in the top half, mines and barrels in pairs, and all of
+    # it mirrored in the bottom half for the other player
+    rng = _rng(seed)
+    rand = rng.random
+    count = 1 + int(rand() * MAX_SHIPS)
+    top, bottom = [], []
+    used = 0
+    for i in range(count):
+        x_min = 1 + i * MAP_WIDTH // count
+        x_max = (i + 1) * MAP_WIDTH // count - 2
+        pos = cell_of(x_min + int(rand() * (1 + x_max - x_min)), 1 + int(rand() * (MAP_HEIGHT // 2 - 2)))
+        ori = int(rand() * 6)
+        top.append(Ship(pos, ori, 1))
+        bottom.append(Ship(FLIP[pos], (6 - ori) % 6, 0))
+        used |= HULLS[6 * pos + ori] | HULLS[6 * FLIP[pos] + (6 - ori) % 6]
+
+    def pair():
+        # a free cell of the top half and its mirror (the same cell on the middle row)
+        nonlocal used
+        while True:
+            cell = cell_of(1 + int(rand() * (MAP_WIDTH - 2)), 1 + int(rand() * (MAP_HEIGHT // 2)))
+            mask = CELL_BITS[cell] | CELL_BITS[FLIP[cell]]
+            if not used & mask:
+                used |= mask
+                return (cell,) if FLIP[cell] == cell else (cell, FLIP[cell])
+
+    mines = []
+    count = MIN_MINES + int(rand() * (MAX_MINES - MIN_MINES))  # 5 .. 9 like the game's referee
+    while len(mines) < count:
+        mines.extend(Mine(cell) for cell in pair())
+    barrels = []
+    count = MIN_RUM_BARRELS + int(rand() * (MAX_RUM_BARRELS - MIN_RUM_BARRELS))  # 10 .. 25
+    while len(barrels) < count:
+        health = 10 + int(rand() * 11)
+        barrels.extend(RumBarrel(cell, health) for cell in pair())
+
+    # which side is mine is drawn too, like the player ids of the game
+    if rand() < 0.5:
+        top, bottom = bottom, top
+        for ship in top + bottom:
+            ship.owner = 1 - ship.owner
+    return World(len(top), barrels, [], mines, top, bottom)
+
+
+KINDS = {
+    'random': random_world,
+    'game': game_world,
+}
+
+
+def write_corpus(path, worlds):
+    from replay import ReplayWriter
+
+    with ReplayWriter(path) as writer:
+        for world in worlds:
+            writer.add(world)
+            writer.end_game()
+
+
+def main(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Write a corpus of seeded worlds.')
+    parser.add_argument('path')
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--kind', choices=KINDS, default='random')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    make = KINDS[args.kind]
+    write_corpus(args.path, (make(rng) for _ in range(args.count)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
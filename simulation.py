@@ -0,0 +1,75 @@
+import queue
+import threading
+
+from referee_opti import *
+
+# Plays a game in a worker thread, ahead of what is shown: the bots are asked
+# for their moves on copies of the world, the turn is played with World.play,
+# and the moves go into a bounded queue. The UI takes them when it wants to
+# show the next turn (History.append plays them again, it is cheap next to
+# the bots), so a slow bot never blocks the window.
+#
+#   simulation = Simulation(history.last, (my_bot, enemy_bot), ahead=20)
+#   moves = simulation.take()  # (my moves, enemy moves), None if not ready yet
+#   simulation.over  # once the last turn has been taken
+#   simulation.stop()
+#
+# Like in tournament.py, a bot is a function bot(world) of the world as seen by
+# its side, and the game ends when a side has no ships left, after max_turns
+# or when a bot raises (simulation.error).
+
+
+class Simulation:
+    def __init__(self, world, bots, ahead=20, max_turns=200):
+        self.world = world.copy()
+        self.bots = bots
+        self.max_turns = max_turns
+        self.turns = queue.Queue(ahead)
+        self.stopped = threading.Event()
+        self.over = False
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        world = self.world
+        for _ in range(self.max_turns):
+            if not world.my_ships or not world.enemy_ships:
+                break
+            try:
+                moves = (self.bots[0](world.copy()), self.bots[1](world.mirror()))
+            except Exception as e:
+                self.error = repr(e)
+                break
+            over = world.play((world.my_ships[:], world.enemy_ships[:]), moves)
+            if not self.put(moves) or over:
+                break
+        self.put(None)
+
+    def put(self, item):
+        # waits for room in the queue, False when stopped
+        while not self.stopped.is_set():
+            try:
+                self.turns.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def take(self):
+        if self.over:
+            return None
+        try:
+            moves = self.turns.get_nowait()
+        except queue.Empty:
+            return None
+        if moves is None:
+            self.over = True
+        return moves
+
+    def ready(self):
+        # turns computed and not taken yet
+        return self.turns.qsize()
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,41 @@
+import ga
+from scenarios import random_world
+from tournament import play_game
+
+# ga.bot in tournament games: one GA per side, kept from one turn to the next.
+
+
+def test_one_ga_per_side(monkeypatch):
+    made = []
+
+    class CountingGA(ga.GA):
+        def __init__(self, *args, **kwargs):
+            made.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(ga, 'GA', CountingGA)
+    monkeypatch.setattr(ga, '_searchers', {})
+
+    result = play_game([ga.bot, ga.bot], 5, max_turns=15)
+    assert result['turns'] > 1 and result['error'] is None
+    assert len(made) == 2
+    # the next game starts with new ones
+    play_game([ga.bot, ga.bot], 6, max_turns=3)
+    assert len(made) == 4
+
+
+def test_seeded_by_the_first_world(monkeypatch):
+    # with nothing left to the clock, the same world gives the same moves
+    class InstantGA(ga.GA):
+        def search(self, world, budget=0):
+            return super().search(world, 0)
+
+    monkeypatch.setattr(ga, 'GA', InstantGA)
+    plays = []
+    for seed in range(2):
+        monkeypatch.setattr(ga, '_searchers', {})
+        world = random_world(seed)
+        plays.append([ga.bot(world.copy()), ga.bot(world.mirror())])
+    monkeypatch.setattr(ga, '_searchers', {})
+    assert [ga.bot(random_world(0)), ga.bot(random_world(0).mirror())] == plays[0]
+    assert plays[0] != plays[1]
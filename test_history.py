@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from history import History
+from replay import Replay, decode, record_games
+from test_referee_vector import state
+from tournament import random_bot
+
+# The worlds of a History against the records of a replay, in any order.
+
+EVERY = (1, 3, 7, 10, 64)
+
+
+@pytest.fixture(scope='module')
+def replay(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('history') / 'games.rpl')
+    record_games(path, [random_bot, random_bot], range(3), max_turns=45)
+    return Replay(path)
+
+
+def check(history, records, turns):
+    for t in turns:
+        world = history[t]
+        assert state(world) == state(decode(records[t])), t
+        assert world.hash == decode(records[t]).hash, t
+
+
+def orders(n, seed):
+    rng = random.Random(seed)
+    return list(range(n)), list(range(n - 1, -1, -1)), [rng.randrange(n) for _ in range(3 * n)]
+
+
+@pytest.mark.parametrize('every', EVERY)
+def test_from_replay(replay, every):
+    for game in range(len(replay.games)):
+        records = replay.game(game)
+        for turns in orders(len(records), every):
+            history = History.from_replay(replay, game, every)
+            assert len(history) == len(records)
+            check(history, records, turns)
+
+
+@pytest.mark.parametrize('every', EVERY)
+def test_append(replay, every):
+    # the same worlds when the turns are played into the history
+    for game in range(len(replay.games)):
+        records = replay.game(game)
+        history = History(decode(records[0]), every)
+        for moves in History.from_replay(replay, game).moves:
+            history.append(*moves)
+        for turns in orders(len(records), every):
+            check(history, records, turns)
+        assert state(history[-1]) == state(decode(records[-1]))
+        with pytest.raises(IndexError):
+            history[len(records)]
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from plan_trie import PlanTrie
+from referee_opti import *
+from scenarios import random_world
+from test_referee_opti import random_moves
+
+# PlanTrie against one World.rollout per plan: same scores, and the updates it
+# counts are the distinct prefixes played.
+
+DEPTH = 6
+
+
+def score(world):
+    return world.hash
+
+
+def plans(rng, world, n):
+    # plans sharing prefixes, some shorter, some the same, one empty
+    def plan(depth):
+        return [random_moves(rng, world.my_ships) for _ in range(depth)]
+
+    out = [([], [])]
+    while len(out) < n:
+        if rng.random() < 0.7:
+            base = rng.choice(out)
+            cut = rng.randrange(len(base[0]) + 1)
+            depth = rng.randrange(cut, DEPTH + 1)
+            out.append((base[0][:cut] + plan(depth - cut), base[1][:depth]))
+        else:
+            out.append((plan(DEPTH), [random_moves(rng, world.enemy_ships) for _ in range(rng.randrange(DEPTH))]))
+    return out
+
+
+def rollout(world, my_plan, enemy_plan):
+    # the score at the end of the plan and the turns it played
+    world = world.copy()
+    scores = list(world.rollout(my_plan, enemy_plan, score=score))
+    return (scores[-1] if scores else score(world)), len(scores)
+
+
+def key(my_plan, enemy_plan, turn):
+    return (tuple(tuple(moves) for moves in my_plan[:turn]),
+            tuple(tuple(moves) for moves in enemy_plan[:turn]))
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_same_as_rollout(seed):
+    rng = random.Random(seed)
+    world = random_world(seed)
+    if seed % 2:
+        # so that many games end before the plans do
+        for ship in world.enemy_ships:
+            ship.health = rng.randrange(1, DEPTH)
+    before = world.hash
+
+    population = plans(rng, world, 40)
+    trie = PlanTrie()
+    for i, (my_plan, enemy_plan) in enumerate(population):
+        assert trie.insert(my_plan, enemy_plan) == i
+    scores = trie.evaluate(world, score)
+    assert world.hash == before
+
+    played = set()
+    prefixes = {key([], [], 0)}
+    naive = 0
+    for i, (my_plan, enemy_plan) in enumerate(population):
+        expected, turns = rollout(world, my_plan, enemy_plan)
+        assert scores[i] == expected, i
+        naive += turns
+        played.update(key(my_plan, enemy_plan, t) for t in range(1, turns + 1))
+        prefixes.update(key(my_plan, enemy_plan, t) for t in range(max(len(my_plan), len(enemy_plan)) + 1))
+
+    assert len(trie) == len(population)
+    assert trie.stats() == {
+        'plans': len(population),
+        'nodes': len(prefixes),
+        'updates': len(played),
+        'naive_updates': naive,
+        'saved': naive - len(played),
+        'saved_ratio': (naive - len(played)) / naive if naive else 0,
+    }
+
+
+def test_game_over():
+    # the enemy sinks on the first turn: every plan below gets that score
+    world = World(1, [], [], [], [Ship(cell_of(5, 5), 0, 1)], [Ship(cell_of(15, 15), 0, 0, health=1)])
+    wait = [(Action.WAIT, None)]
+    trie = PlanTrie()
+    for depth in range(1, 4):
+        trie.insert([wait] * depth)
+    trie.insert([[(Action.FASTER, None)]] * 3)
+
+    over = world.copy()
+    assert over.play((over.my_ships[:], over.enemy_ships[:]), ([(Action.WAIT, None)], ()))
+    scores = trie.evaluate(world, score)
+    assert scores[:3] == [score(over)] * 3
+    assert scores[3] == rollout(world, [[(Action.FASTER, None)]] * 3, [])[0]
+    assert trie.stats()['updates'] == 2
+    assert trie.stats()['naive_updates'] == 4
@@ -0,0 +1,116 @@
+import random
+from collections import deque
+
+import pytest
+
+import planner
+from planner import *
+from tournament import play_game
+
+# Fields against a plain search over EDGE_NEXT, EDGE_NEXT against the referee,
+# and planner.bot in tournament games.
+
+
+def test_one_planner_per_side(monkeypatch):
+    made = []
+
+    class CountingPlanner(planner.Planner):
+        def __init__(self, *args, **kwargs):
+            made.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(planner, 'Planner', CountingPlanner)
+    monkeypatch.setattr(planner, '_planners', {})
+
+    result = play_game([planner.bot, planner.bot], 5, max_turns=15)
+    assert result['turns'] == 15 and result['error'] is None
+    assert len(made) == 2
+    assert all(p.hits for p in made)  # the fields are used again on the next turns
+    play_game([planner.bot, planner.bot], 6, max_turns=3)
+    assert len(made) == 4
+
+
+def reference_turns(target, mines):
+    # a plain breadth-first search backwards over EDGE_NEXT
+    bit = CELL_BITS[target]
+    into = [[] for _ in range(STATES)]
+    turns = [UNREACHABLE] * STATES
+    queue = deque()
+    for state in range(18 * MAP_CELLS):
+        if HULLS[state // 3] & bit:
+            turns[state] = 0
+            continue
+        for edge in range(5 * state, 5 * state + 5):
+            if EDGE_MASKS[edge] & mines:
+                continue
+            if EDGE_MASKS[edge] & bit:
+                if turns[state] == UNREACHABLE:
+                    turns[state] = 1
+                    queue.append(state)
+            else:
+                into[EDGE_NEXT[edge]].append(state)
+    while queue:
+        state = queue.popleft()
+        for previous in into[state]:
+            if turns[previous] == UNREACHABLE:
+                turns[previous] = turns[state] + 1
+                queue.append(previous)
+    return turns
+
+
+def random_mines(rng, target, count=40):
+    return mask_of_cells(cell for cell in rng.sample(range(MAP_CELLS), count) if cell != target)
+
+
+def check_edges(field, mines):
+    # each first edge keeps off the mines and goes one turn closer
+    bit = CELL_BITS[field.target]
+    for state in range(18 * MAP_CELLS):
+        edge = field.edges[state]
+        if field.turns[state] in (0, UNREACHABLE):
+            assert edge == -1
+            continue
+        assert edge // 5 == state and not EDGE_MASKS[edge] & mines
+        if field.turns[state] == 1:
+            assert EDGE_MASKS[edge] & bit
+        else:
+            assert field.turns[EDGE_NEXT[edge]] == field.turns[state] - 1
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_field_same_as_bfs(seed):
+    rng = random.Random(seed)
+    target = rng.randrange(MAP_CELLS)
+    mines = random_mines(rng, target)
+    field = Field(target, mines)
+    assert list(field.turns[:18 * MAP_CELLS]) == reference_turns(target, mines)[:18 * MAP_CELLS]
+    check_edges(field, mines)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_repair_same_as_new_field(seed):
+    rng = random.Random(seed)
+    target = rng.randrange(MAP_CELLS)
+    mines = random_mines(rng, target, 20)
+    field = Field(target, mines)
+    for _ in range(3):
+        new_mines = random_mines(rng, target, 5) & ~mines
+        mines |= new_mines
+        field.repair(mines, new_mines)
+        assert field.turns == Field(target, mines).turns
+        check_edges(field, mines)
+
+
+def test_edges_same_as_update():
+    # one ship alone, from a random state and move
+    rng = random.Random(0)
+    for _ in range(2000):
+        state = rng.randrange(18 * MAP_CELLS)
+        i = rng.randrange(len(MOVES))
+        pose, speed = divmod(state, 3)
+        ship = Ship(pose // 6, pose % 6, 1, speed)
+        world = World(1, [], [], [], [ship], [])
+        world.prepare()
+        world.set_actions(1, [(MOVES[i], None)])
+        world.update()
+        assert 3 * (6 * ship.pos + ship.ori) + ship.speed == EDGE_NEXT[5 * state + i], (state, MOVES[i])
@@ -0,0 +1,346 @@
+import random
+
+import pytest
+
+import referee
+from referee_opti import *
+from scenarios import random_world
+
+# Differential tests of referee_opti: seeded worlds played with random moves
+# against referee.py (the straightforward engine, with Coord positions) and
+# against itself through the other ways of playing a turn.
+
+SEEDS = range(100)
+TURNS = 30
+
+REFEREE_ACTIONS = {
+    Action.WAIT: referee.Action.WAIT,
+    Action.FASTER: referee.Action.FASTER,
+    Action.SLOWER: referee.Action.SLOWER,
+    Action.GAUCHE: referee.Action.GAUCHE,
+    Action.DROITE: referee.Action.DROITE,
+    Action.FIRE: referee.Action.FIRE,
+    Action.MINE: referee.Action.MINE,
+}
+
+
+def random_moves(rng, ships):
+    # any action, shots at any cell of the map (out of range ones included)
+    return [(action, rng.randrange(MAP_CELLS) if action == Action.FIRE else None)
+            for action in (rng.randrange(len(REFEREE_ACTIONS)) for _ in ships)]
+
+
+def play(world, moves):
+    world.prepare()
+    world.set_actions(1, moves[0])
+    world.set_actions(0, moves[1])
+    return world.update()
+
+
+def state(world):
+    # everything the rules depend on, as coordinates
+    def ship(s):
+        return to_coord(s.pos), s.ori, s.speed, s.health, s.mine_cooldown, s.canon_cooldown
+
+    return (sorted((to_coord(b.pos), b.health) for b in world.barrels),
+            sorted((to_coord(b.pos), b.remaining_turns) for b in world.cannon_balls),
+            sorted(to_coord(m.pos) for m in world.mines),
+            [ship(s) for s in world.my_ships], [ship(s) for s in world.enemy_ships])
+
+
+def referee_world(world):
+    def ship(s):
+        return referee.Ship(CELL_X[s.pos], CELL_Y[s.pos], s.ori, s.owner, s.speed, s.health)
+
+    return referee.World(world.my_ship_count,
+                         [referee.RumBarrel(CELL_X[b.pos], CELL_Y[b.pos], b.health) for b in world.barrels],
+                         [referee.CannonBall(CELL_X[b.pos], CELL_Y[b.pos], b.remaining_turns)
+                          for b in world.cannon_balls],
+                         [referee.Mine(CELL_X[m.pos], CELL_Y[m.pos]) for m in world.mines],
+                         [ship(s) for s in world.my_ships], [ship(s) for s in world.enemy_ships])
+
+
+def referee_state(world):
+    def ship(s):
+        return (s.pos.x, s.pos.y), s.ori, s.speed, s.health, s.mine_cooldown, s.canon_cooldown
+
+    return (sorted(((b.pos.x, b.pos.y), b.health) for b in world.barrels),
+            sorted(((b.pos.x, b.pos.y), b.remaining_turns) for b in world.cannon_balls),
+            sorted((m.pos.x, m.pos.y) for m in world.mines),
+            [ship(s) for s in world.my_ships], [ship(s) for s in world.enemy_ships])
+
+
+def referee_moves(moves):
+    return [(REFEREE_ACTIONS[action], referee.Coord(CELL_X[target], CELL_Y[target]) if target is not None else None)
+            for action, target in moves]
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_same_as_referee(seed):
+    rng = random.Random(seed)
+    world = random_world(seed)
+    other = referee_world(world)
+
+    for turn in range(TURNS):
+        moves = random_moves(rng, world.my_ships), random_moves(rng, world.enemy_ships)
+        over = play(world, moves)
+
+        other.prepare()
+        other.set_actions(1, referee_moves(moves[0]))
+        other.set_actions(0, referee_moves(moves[1]))
+        try:
+            other.update()
+        except InterruptedError:  # referee.py ends the game this way
+            pass
+
+        assert state(world) == referee_state(other), 'turn {}'.format(turn)
+        if over:
+            break
+
+
+def referee_cell(coord):
+    return cell_of(coord.x, coord.y)
+
+
+def test_pose_tables():
+    # END_POSES, END_SPEEDS and SWEEPS against moving a referee.py ship one cell at a time
+    for cell in range(MAP_CELLS):
+        for ori in range(6):
+            pose = 6 * cell + ori
+            center = referee.Coord(CELL_X[cell], CELL_Y[cell])
+            assert NEIGHBORS[pose] == referee_cell(center.neighbor(ori))
+            assert STERNS[pose] == referee_cell(center.neighbor((ori + 3) % 6))
+
+            for speed in range(MAX_SHIP_SPEED + 1):
+                pos, end_speed, path = center, speed, [center]
+                for _ in range(speed):
+                    if not pos.neighbor(ori).is_inside_map():
+                        end_speed = 0
+                        break
+                    pos = pos.neighbor(ori)
+                    path.append(pos)
+                swept = [referee_cell(c) for p in path for c in (p, p.neighbor(ori), p.neighbor((ori + 3) % 6))]
+
+                i = 3 * pose + speed
+                assert END_POSES[i] == 6 * referee_cell(pos) + ori, (cell, ori, speed)
+                assert END_SPEEDS[i] == end_speed, (cell, ori, speed)
+                assert SWEEPS[i] == mask_of_cells(swept), (cell, ori, speed)
+
+
+def test_fire_tables():
+    # a FIRE of referee.py at each cell of the map, from every bow
+    for bow in range(CELLS):
+        origin = referee.Coord(CELL_X[bow], CELL_Y[bow])
+        times = {cell: t for t in range(FIRE_TIMES) for cell in FIRE_TARGETS[FIRE_TIMES * bow + t]}
+        expected = {}
+        for cell in range(MAP_CELLS):
+            distance = origin.distance_to(referee.Coord(CELL_X[cell], CELL_Y[cell]))
+            if distance <= referee.FIRE_DISTANCE_MAX:
+                expected[cell] = int(1 + round(distance / 3))
+        assert times == expected, bow
+        for t in range(FIRE_TIMES):
+            assert FIRE_MASKS[FIRE_TIMES * bow + t] == mask_of_cells(FIRE_TARGETS[FIRE_TIMES * bow + t])
+            assert fire_targets(bow, t, -1 if t else 0) == sorted(FIRE_TARGETS[FIRE_TIMES * bow + t])
+        assert FIRE_RANGES[bow] == mask_of_cells(expected)
+
+
+def full_state(world):
+    # state() with the entity identities, the bitboards and the hash
+    return (state(world), world.my_ship_count, world.hash,
+            world.barrel_mask, world.mine_mask, world.ship_mask, world.explosion_mask,
+            sorted((b.pos, id(b)) for b in world.barrels), sorted((m.pos, id(m)) for m in world.mines),
+            [id(b) for b in world.cannon_balls], list(world.cannon_ball_explosions),
+            [(id(s), s.bow, s.stern) for s in world.my_ships], [(id(s), s.bow, s.stern) for s in world.enemy_ships])
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_undo(seed):
+    rng = random.Random(seed)
+    world = random_world(seed)
+    states = []
+
+    for turn in range(TURNS):
+        world.prepare()
+        world.set_actions(1, random_moves(rng, world.my_ships))
+        world.set_actions(0, random_moves(rng, world.enemy_ships))
+        states.append(full_state(world))
+        if world.update(record=True):
+            break
+
+    while states:
+        world.undo()
+        assert full_state(world) == states.pop(), 'turn {}'.format(len(states))
+    assert not world.journal
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_incremental_hash(seed):
+    rng = random.Random(seed)
+    world = random_world(seed)
+
+    for turn in range(TURNS):
+        over = play(world, (random_moves(rng, world.my_ships), random_moves(rng, world.enemy_ships)))
+        # World() hashes the entities from scratch
+        scratch = World(world.my_ship_count, world.barrels, world.cannon_balls, world.mines,
+                        world.my_ships, world.enemy_ships)
+        assert world.entity_hash == scratch.entity_hash, 'turn {}'.format(turn)
+        assert world.hash == scratch.hash, 'turn {}'.format(turn)
+        if over:
+            break
+
+
+def test_transposition_same_hash():
+    # port then starboard, or two waits, end on the same world
+    world = World(1, [], [], [], [Ship(cell_of(5, 5), 0, 1)], [Ship(cell_of(15, 15), 0, 0)])
+    turned = world.copy()
+    for action in (Action.GAUCHE, Action.DROITE):
+        play(turned, ([(action, None)], [(Action.WAIT, None)]))
+    waited = world.copy()
+    for _ in range(2):
+        play(waited, ([(Action.WAIT, None)], [(Action.WAIT, None)]))
+    assert turned.hash == waited.hash
+    assert turned.hash != world.hash
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_rollout_same_as_play(seed):
+    # plans of (action, target) and of packed moves, indexed by the ships alive at the start
+    rng = random.Random(seed)
+    world = random_world(seed)
+    ships = world.my_ships[:], world.enemy_ships[:]
+    plans = [[random_moves(rng, side) for _ in range(TURNS)] for side in ships]
+
+    other = world.copy()
+    packed = world.copy()
+    states = [state(world)]
+    for turn in range(TURNS):
+        moves = [[m for s, m in zip(side, plan[turn]) if s in alive]
+                 for side, plan, alive in zip(ships, plans, (world.my_ships, world.enemy_ships))]
+        over = play(world, moves)
+        states.append(state(world))
+        if over:
+            break
+
+    assert [state(w) for w in other.rollout(*plans)] == states[1:]
+    packed_plans = [[[pack_move(a, t) for a, t in moves] for moves in plan] for plan in plans]
+    for _ in packed.rollout(*packed_plans, every=TURNS):
+        pass
+    assert state(packed) == states[-1]
+
+
+def play_move(world, mine, index, move):
+    # the state after one ship plays move and all the others wait
+    world = world.copy()
+    world.prepare()
+    for guy, ships in ((1, world.my_ships), (0, world.enemy_ships)):
+        world.set_moves(guy, [move if guy == mine and i == index else Action.WAIT for i in range(len(ships))])
+    world.update()
+    return state(world)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_moves(seed):
+    # moves are distinct, do something, and what they leave out does the same as WAIT
+    rng = random.Random(seed)
+    world = random_world(seed)
+
+    for turn in range(10):
+        for mine, ships in ((1, world.my_ships), (0, world.enemy_ships)):
+            for index, ship in enumerate(ships):
+                moves = list(world.moves(ship, targets=-1))
+                assert len(set(moves)) == len(moves)
+                assert set(world.moves(ship)) <= set(moves)
+
+                assert Action.FASTER not in moves or ship.speed < MAX_SHIP_SPEED
+                assert Action.SLOWER not in moves or ship.speed > 0
+
+                wait = play_move(world, mine, index, Action.WAIT)
+                for action in (Action.FASTER, Action.SLOWER, Action.MINE):
+                    if action not in moves:
+                        assert play_move(world, mine, index, action) == wait, (turn, action)
+                    elif action == Action.MINE:
+                        assert play_move(world, mine, index, action) != wait, turn
+
+                shots = {move >> MOVE_BITS for move in moves if move & MOVE_ACTION == Action.FIRE}
+                if ship.canon_cooldown <= 1:
+                    assert shots == {c for c in range(MAP_CELLS) if FIRE_RANGES[ship.bow] & CELL_BITS[c]}
+                    for target in rng.sample(sorted(shots), min(3, len(shots))):
+                        assert play_move(world, mine, index, pack_move(Action.FIRE, target)) != wait, turn
+                else:
+                    assert not shots
+                    target = rng.randrange(MAP_CELLS)
+                    assert play_move(world, mine, index, pack_move(Action.FIRE, target)) == wait, turn
+                outside = [c for c in range(MAP_CELLS) if not FIRE_RANGES[ship.bow] & CELL_BITS[c]]
+                assert play_move(world, mine, index, pack_move(Action.FIRE, rng.choice(outside))) == wait, turn
+
+        if play(world, (random_moves(rng, world.my_ships), random_moves(rng, world.enemy_ships))):
+            break
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_next_turn(seed):
+    # every turn of a game follows the one before, from both sides, the start of another game doesn't
+    rng = random.Random(seed)
+    world = random_world(seed)
+    other = random_world(seed + 1000)
+
+    for turn in range(TURNS):
+        before = progress(world), progress(world.mirror())
+        if play(world, (random_moves(rng, world.my_ships), random_moves(rng, world.enemy_ships))):
+            break
+        assert next_turn(world, before[0]) and next_turn(world.mirror(), before[1]), turn
+        assert not next_turn(other, progress(world))
+    assert not next_turn(world, None)
+
+
+def input_lines(world, ids):
+    # the game input of a world, an entity keeps its id while it is in play
+    def line(entity, text):
+        if id(entity) not in ids:
+            ids[id(entity)] = len(ids), entity  # kept so that id() is not reused
+        return '{} {}'.format(ids[id(entity)][0], text)
+
+    lines = []
+    for owner, ships in ((1, world.my_ships), (0, world.enemy_ships)):
+        for ship in ships:
+            lines.append(line(ship, 'SHIP {} {} {} {} {} {}'.format(
+                CELL_X[ship.pos], CELL_Y[ship.pos], ship.ori, ship.speed, ship.health, owner)))
+    for barrel in world.barrels:
+        lines.append(line(barrel, 'BARREL {} {} {} 0 0 0'.format(CELL_X[barrel.pos], CELL_Y[barrel.pos], barrel.health)))
+    for mine in world.mines:
+        lines.append(line(mine, 'MINE {} {} 0 0 0 0'.format(CELL_X[mine.pos], CELL_Y[mine.pos])))
+    for ball in world.cannon_balls:
+        lines.append(line(ball, 'CANNONBALL {} {} 0 {} 0 0'.format(
+            CELL_X[ball.pos], CELL_Y[ball.pos], ball.remaining_turns)))
+    return lines
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_turn_reader(seed):
+    # the world the reader patches turn after turn is the one World() builds from scratch
+    rng = random.Random(seed)
+    world = random_world(seed)
+    reader = TurnReader()
+    ids = {}
+
+    for turn in range(TURNS):
+        read = reader.update(world.my_ship_count, input_lines(world, ids))
+        assert read is reader.world
+        # the input has no cooldowns
+        scratch = World(world.my_ship_count, world.barrels, [b.copy() for b in world.cannon_balls], world.mines,
+                        [Ship(s.pos, s.ori, 1, s.speed, s.health) for s in world.my_ships],
+                        [Ship(s.pos, s.ori, 0, s.speed, s.health) for s in world.enemy_ships])
+        assert state(read) == state(scratch), 'turn {}'.format(turn)
+        assert read.my_ship_count == scratch.my_ship_count
+        assert (read.barrel_mask, read.mine_mask, read.ship_mask) == \
+               (scratch.barrel_mask, scratch.mine_mask, scratch.ship_mask), 'turn {}'.format(turn)
+        assert read.entity_hash == scratch.entity_hash, 'turn {}'.format(turn)
+        assert read.hash == scratch.hash, 'turn {}'.format(turn)
+        assert [s.owner for s in read.my_ships + read.enemy_ships] == \
+               [1] * len(world.my_ships) + [0] * len(world.enemy_ships)
+        assert reader.my_ship_ids == [ids[id(s)][0] for s in world.my_ships]
+        assert set(reader.entities) == {ids[id(e)][0] for e in world.barrels + world.mines + world.cannon_balls
+                                        + world.my_ships + world.enemy_ships}
+
+        if play(world, (random_moves(rng, world.my_ships), random_moves(rng, world.enemy_ships))):
+            break
@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+
+from referee_opti import *
+from referee_vector import VectorWorld
+from scenarios import random_world
+from test_referee_opti import play, random_moves
+
+# VectorWorld against World: the same seeded worlds and moves, turn by turn.
+
+WORLDS = 200
+TURNS = 30
+
+
+def state(world):
+    # in slot order, like VectorWorld.world gives them back
+    def ship(s):
+        return s.pos, s.ori, s.speed, s.health, s.mine_cooldown, s.canon_cooldown, s.owner
+
+    return (sorted((b.pos, b.health) for b in world.barrels),
+            sorted((b.pos, b.remaining_turns) for b in world.cannon_balls),
+            sorted(m.pos for m in world.mines),
+            [ship(s) for s in world.my_ships], [ship(s) for s in world.enemy_ships])
+
+
+def test_step_same_as_update():
+    rng = random.Random(0)
+    worlds = [random_world(rng) for _ in range(WORLDS)]
+    vw = VectorWorld.from_worlds(worlds)
+
+    for turn in range(TURNS):
+        moves = [(random_moves(rng, w.my_ships), random_moves(rng, w.enemy_ships)) for w in worlds]
+        codes, targets = vw.encode_actions([m[0] for m in moves], [m[1] for m in moves])
+        for world, world_moves in zip(worlds, moves):
+            play(world, world_moves)
+        over = vw.step(codes, targets)
+
+        for i, world in enumerate(worlds):
+            assert state(vw.world(i)) == state(world), 'world {} turn {}'.format(i, turn)
+        assert np.array_equal(over, [world.game_is_over() for world in worlds])
+
+
+def test_rollout_same_as_world_rollout():
+    # ended games are frozen by VectorWorld.rollout where World.rollout stops
+    rng = random.Random(1)
+    worlds = [random_world(rng) for _ in range(WORLDS)]
+    vw = VectorWorld.from_worlds(worlds)
+    plans = [([random_moves(rng, w.my_ships) for _ in range(TURNS)],
+              [random_moves(rng, w.enemy_ships) for _ in range(TURNS)]) for w in worlds]
+
+    codes, targets = zip(*(vw.encode_actions([p[0][turn] for p in plans], [p[1][turn] for p in plans])
+                           for turn in range(TURNS)))
+    for world, (my_plan, enemy_plan) in zip(worlds, plans):
+        for _ in world.rollout(my_plan, enemy_plan):
+            pass
+    for _ in vw.rollout(np.array(codes), np.array(targets), every=TURNS):
+        pass
+
+    assert any(world.game_is_over() for world in worlds)
+    for i, world in enumerate(worlds):
+        assert state(vw.world(i)) == state(world), 'world {}'.format(i)
@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from referee_opti import *
+from replay import Replay, ReplayWriter, decode, encode, record_games, record_moves
+from scenarios import random_world
+from test_referee_opti import random_moves
+from test_referee_vector import state
+from tournament import random_bot
+
+# Replays: worlds and moves through a record, and recorded games played again.
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_decode_encode(seed):
+    rng = random.Random(seed)
+    world = random_world(seed)
+    moves = random_moves(rng, world.my_ships), random_moves(rng, world.enemy_ships)
+    record = encode(world, *moves)
+    decoded = decode(record)
+    assert state(decoded) == state(world)
+    assert decoded.my_ship_count == world.my_ship_count
+    assert decoded.hash == world.hash
+    assert record_moves(record) == tuple(tuple(pack_moves(m)) for m in moves)
+
+
+def test_too_many_entities():
+    world = random_world(0, barrels=33, mines=0, balls=0)
+    with pytest.raises(ValueError):
+        encode(world)
+    world = random_world(0, barrels=0, mines=0, balls=33)
+    with pytest.raises(ValueError):
+        encode(world)
+
+
+def test_verify(tmp_path):
+    path = str(tmp_path / 'games.rpl')
+    record_games(path, [random_bot, random_bot], range(5), max_turns=50)
+    replay = Replay(path)
+    assert len(replay.games) == 5
+    assert sum(replay.games['turns']) == len(replay)
+    assert all(replay.verify(g) == [] for g in range(len(replay.games)))
+
+    # a turn that the referee doesn't give is found
+    wrong = str(tmp_path / 'wrong.rpl')
+    with ReplayWriter(wrong) as writer:
+        for t in range(3):
+            world = replay.world(t)
+            if t == 1:
+                world.my_ships[0].health += 1
+            writer.add(world, *replay.moves(t))
+    assert Replay(wrong).verify(0) == [0, 1]
@@ -0,0 +1,20 @@
+from referee_opti import *
+from tournament import play_game, random_bot
+
+# play_game: what the bots are given.
+
+
+def test_sides_by_owner():
+    # each bot sees its own ships first, all with its owner, whichever world the seed draws
+    seen = ([], [])
+
+    def bot(side):
+        def play(world):
+            seen[side].append((tuple(s.owner for s in world.my_ships), tuple(s.owner for s in world.enemy_ships)))
+            return random_bot(world)
+        return play
+
+    for seed in range(20):
+        play_game([bot(0), bot(1)], seed, max_turns=5)
+    assert all(set(mine) == {1} and set(enemies) == {0} for mine, enemies in seen[0])
+    assert all(set(mine) == {0} and set(enemies) == {1} for mine, enemies in seen[1])
@@ -0,0 +1,82 @@
+import pytest
+
+from zobrist import TranspositionTable
+
+# TranspositionTable on a 4-slot table: keys 1, 5 and 9 share slot 1.
+
+A, B, C = 1, 5, 9
+
+
+def counters(table):
+    return table.probes, table.hits, table.stores, table.replacements, table.rejections, len(table)
+
+
+@pytest.mark.parametrize('policy', TranspositionTable.POLICIES)
+def test_get_put(policy):
+    table = TranspositionTable(4, policy)
+    assert table.get(A) is None
+    assert table.put(A, 'a', 2)
+    assert table.get(A) == 'a'
+    assert table.get(A, 2) == 'a'
+    assert table.get(A, 3) is None  # not searched that deep
+    assert table.get(B) is None  # same slot, other key
+    # the same key is always updated, even less deep
+    assert table.put(A, 'a1', 1)
+    assert table.get(A, 1) == 'a1' and table.get(A, 2) is None
+    assert table.put(2, 'x')
+    assert counters(table) == (7, 3, 3, 0, 0, 2)
+
+    with pytest.raises(AssertionError):
+        table.put(C, None)
+    assert table.get(C) is None
+
+
+def test_always():
+    table = TranspositionTable(4, 'always')
+    assert table.put(A, 'a', 5)
+    assert table.put(B, 'b', 0)
+    assert table.get(A) is None and table.get(B) == 'b'
+    assert table.put(C, 'c', 3)
+    assert table.get(C, 3) == 'c'
+    assert counters(table) == (3, 2, 3, 2, 0, 1)
+
+
+def test_depth():
+    table = TranspositionTable(4, 'depth')
+    assert table.put(A, 'a', 3)
+    assert not table.put(B, 'b', 2)  # shallower: kept out
+    assert table.get(A, 3) == 'a' and table.get(B) is None
+    assert table.put(B, 'b', 3)  # as deep: replaces
+    assert table.get(B) == 'b'
+    table.new_generation()
+    assert not table.put(C, 'c', 1)  # generations don't matter
+    assert table.get(B) == 'b'
+    assert counters(table) == (4, 3, 2, 1, 2, 1)
+
+
+def test_age():
+    table = TranspositionTable(4, 'age')
+    assert table.put(A, 'a', 3)
+    assert not table.put(B, 'b', 2)  # shallower, same generation: kept out
+    assert table.put(B, 'b', 4)  # deeper: replaces
+    assert table.get(A) is None and table.get(B, 4) == 'b'
+    table.new_generation()
+    assert table.generation == 1
+    assert table.put(C, 'c', 2)  # the old entry goes, however deep
+    assert table.get(C) == 'c' and table.get(B) is None
+    assert not table.put(A, 'a', 1)  # but not the ones of this generation
+    assert table.get(C) == 'c'
+    assert counters(table) == (5, 3, 3, 2, 2, 1)
+
+
+def test_clear():
+    table = TranspositionTable(4, 'depth')
+    table.put(A, 'a')
+    table.get(A)
+    table.new_generation()
+    table.clear()
+    assert (table.size, table.policy, table.generation) == (4, 'depth', 0)
+    assert counters(table) == (0, 0, 0, 0, 0, 0)
+    assert table.get(A) is None
+    assert table.stats() == {'size': 4, 'used': 0, 'probes': 1, 'hits': 0, 'hit_rate': 0, 'stores': 0,
+                             'replacements': 0, 'rejections': 0}
@@ -0,0 +1,95 @@
+from collections import namedtuple
+
+# Cells are numbered with ints: 0 .. MAP_CELLS-1 are the cells of the map
+# (cell = x + y * MAP_WIDTH), then come the cells of the ring just around it,
+# where the bow or the stern of a ship on the border sticks out, and last
+# OFF_MAP, the sentinel for everything further away.
+#
+# NEIGHBORS[6 * cell + orientation] and DISTANCES[a][b] replace the old
+# neighbor() and distance_to(). Coord is only used to read and write x, y.
+
+MAP_WIDTH = 23
+MAP_HEIGHT = 21
+MAP_CELLS = MAP_WIDTH * MAP_HEIGHT
+
+DIRECTIONS_EVEN = ((1, 0),
+                   (0, -1),
+                   (-1, -1),
+                   (-1, 0),
+                   (-1, 1),
+                   (0, 1))
+DIRECTIONS_ODD = ((1, 0),
+                  (1, -1),
+                  (0, -1),
+                  (-1, 0),
+                  (0, 1),
+                  (1, 1))
+
+Coord = namedtuple('P', ['x', 'y'])
+
+
+def is_inside(x, y):
+    return 0 <= x < MAP_WIDTH and 0 <= y < MAP_HEIGHT
+
+
+def offset_distance(ax, ay, bx, by):
+    if ax < bx:
+        return offset_distance(bx, by, ax, ay)
+
+    magic = ax - bx + (by - ay + ((ay & 1) - (by & 1))) // 2
+
+    return (abs(magic) + abs(magic + ay - by) + abs(ay - by)) // 2
+
+
+CELL_X = [x for y in range(MAP_HEIGHT) for x in range(MAP_WIDTH)]
+CELL_Y = [y for y in range(MAP_HEIGHT) for x in range(MAP_WIDTH)]
+for _y in range(-1, MAP_HEIGHT + 1):
+    for _x in range(-1, MAP_WIDTH + 1):
+        if not is_inside(_x, _y):
+            CELL_X.append(_x)
+            CELL_Y.append(_y)
+
+CELLS = len(CELL_X)
+OFF_MAP = CELLS
+CELL_X.append(-1000)
+CELL_Y.append(-1000)
+
+_CELL_OF = {(x, y): cell for cell, (x, y) in enumerate(zip(CELL_X, CELL_Y))}
+
+
+def cell_of(x, y):
+    return _CELL_OF.get((x, y), OFF_MAP)
+
+
+def to_coord(cell):
+    return Coord(CELL_X[cell], CELL_Y[cell])
+
+
+NEIGHBORS = []
+for _cell in range(CELLS):
+    _x, _y = CELL_X[_cell], CELL_Y[_cell]
+    for _dx, _dy in DIRECTIONS_ODD if _y & 1 else DIRECTIONS_EVEN:
+        NEIGHBORS.append(cell_of(_x + _dx, _y + _dy))
+NEIGHBORS.extend([OFF_MAP] * 6)
+
+# one bytes row per cell, OFF_MAP is at distance 255 from everything else
+DISTANCES = [bytes(offset_distance(CELL_X[a], CELL_Y[a], CELL_X[b], CELL_Y[b]) for b in range(CELLS)) + b'\xff'
+             for a in range(CELLS)]
+DISTANCES.append(bytes([255] * CELLS) + b'\x00')
+
+# bitboards: CELL_BITS[cell] is the bit of a cell, NEAR_MASKS[cell] the cells
+# at distance <= 1 and HULLS[6 * cell + orientation] the bow, center and
+# stern of a ship there
+CELL_BITS = [1 << cell for cell in range(CELLS + 1)]
+NEAR_MASKS = [sum(CELL_BITS[b] for b in {a}.union(NEIGHBORS[6 * a:6 * a + 6]) if DISTANCES[a][b] <= 1)
+              for a in range(CELLS + 1)]
+HULLS = [CELL_BITS[_cell] | CELL_BITS[NEIGHBORS[6 * _cell + _o]] | CELL_BITS[NEIGHBORS[6 * _cell + (_o + 3) % 6]]
+         for _cell in range(CELLS + 1) for _o in range(6)]
+
+# ship poses, pose = 6 * cell + orientation as for HULLS: the bow is
+# NEIGHBORS[pose], the stern STERNS[pose], and STEPS[pose] is the center after
+# one cell forward, or -1 when the ship has to stop on the border of the map.
+# Rotating keeps the center: pose - orientation + new orientation.
+POSES = 6 * (CELLS + 1)
+STERNS = [NEIGHBORS[_pose - _pose % 6 + (_pose + 3) % 6] for _pose in range(POSES)]
+STEPS = [NEIGHBORS[_pose] if NEIGHBORS[_pose] < MAP_CELLS else -1 for _pose in range(POSES)]
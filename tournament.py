@@ -0,0 +1,273 @@
+import json
+import random
+import sys
+from importlib import import_module
+from itertools import combinations
+from math import log10, sqrt
+from multiprocessing import Pool
+from time import perf_counter
+
+from referee_opti import *
+
+# Headless self-play: seeded games between bots on a process pool, then win
+# rates and Elo ratings with 95% confidence intervals.
+#
+# A bot is a function bot(world) -> [(action, target), ...], one per ship of
+# world.my_ships. It always gets a copy of the world seen from its side, where
+# the owner of its ships is 1 for the first bot and 0 for the second one.
+# Bots are given as 'module:function' so that the workers can import them.
+# A seed always draws the same world, the games of bots that search until a
+# deadline (mcts:bot, ga:bot) also depend on how much they get done by then.
+#
+#   python tournament.py tournament:random_bot tournament:wait_bot --games 1000 --workers 8
+
+MAX_TURNS = 200
+TIME_LIMIT = 0.050
+
+
+def wait_bot(world):
+    return [(Action.WAIT, None) for _ in world.my_ships]
+
+
+def random_bot(world):
+    actions = []
+    for ship in world.my_ships:
+        action = random.choice((Action.WAIT, Action.FASTER, Action.SLOWER, Action.GAUCHE, Action.DROITE,
+                                Action.FIRE, Action.MINE))
+        target = random.choice(world.enemy_ships).pos if action == Action.FIRE else None
+        actions.append((action, target))
+    return actions
+
+
+_bots = {}
+
+
+def load_bot(spec):
+    if spec not in _bots:
+        module, name = spec.split(':')
+        _bots[spec] = getattr(import_module(module), name)
+    return _bots[spec]
+
+
+def play_game(bots, seed, max_turns=MAX_TURNS, time_limit=TIME_LIMIT):
+    # bots[0] plays World.my_ships of the seeded world, bots[1] the enemies.
+    # The winner is the side with ships left, or with the most rum after
+    # max_turns, None for a draw.
+    random.seed(seed)
+    world = get_random_world()
+    times = ([], [])
+    overtime = [0, 0]
+    error = None
+
+    turn = 0
+    while turn < max_turns:
+        turn += 1
+        actions = [None, None]
+        for side in (0, 1):
+            view = world.copy() if side == 0 else world.mirror()
+            start = perf_counter()
+            try:
+                actions[side] = bots[side](view)
+            except Exception as e:
+                error = (side, repr(e))
+            think = perf_counter() - start
+            times[side].append(think)
+            if think > time_limit:
+                overtime[side] += 1
+
+        if error is not None:
+            break
+
+        world.prepare()
+        try:
+            world.set_actions(1, actions[0])
+        except Exception as e:
+            error = (0, repr(e))
+        try:
+            world.set_actions(0, actions[1])
+        except Exception as e:
+            error = error or (1, repr(e))
+        if error is not None:
+            break
+
+        if world.update():
+            break
+
+    if error is not None:
+        winner = 1 - error[0]
+    else:
+        rums = (sum(s.health for s in world.my_ships), sum(s.health for s in world.enemy_ships))
+        if bool(world.my_ships) != bool(world.enemy_ships):
+            winner = 0 if world.my_ships else 1
+        elif rums[0] != rums[1]:
+            winner = 0 if rums[0] > rums[1] else 1
+        else:
+            winner = None
+
+    return {
+        'seed': seed,
+        'winner': winner,
+        'turns': turn,
+        'times': times,
+        'overtime': overtime,
+        'error': error,
+    }
+
+
+def _play(task):
+    specs, seed, max_turns, time_limit = task
+    result = play_game([load_bot(s) for s in specs], seed, max_turns, time_limit)
+    result['bots'] = list(specs)
+    return result
+
+
+def schedule(specs, games, seed=0, max_turns=MAX_TURNS, time_limit=TIME_LIMIT):
+    # every pair of bots plays `games` games, each seed once from both sides
+    tasks = []
+    for a, b in combinations(specs, 2):
+        for i in range(games):
+            game_seed = seed + i // 2
+            pair = (a, b) if i % 2 == 0 else (b, a)
+            tasks.append((pair, game_seed, max_turns, time_limit))
+    return tasks
+
+
+def run(specs, games, workers=None, seed=0, max_turns=MAX_TURNS, time_limit=TIME_LIMIT, out=None):
+    tasks = schedule(specs, games, seed, max_turns, time_limit)
+    results = []
+
+    with Pool(workers) as pool:
+        for result in pool.imap_unordered(_play, tasks, chunksize=max(1, len(tasks) // (64 * (workers or 4)))):
+            results.append(result)
+            if out is not None:
+                out.write(json.dumps(result) + '\n')
+
+    return results
+
+
+# statistics
+
+def wilson(score, n, z=1.96):
+    # 95% interval of a win rate (draws count half)
+    if n == 0:
+        return 0, 1
+    p = score / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return center - half, center + half
+
+
+def scores(results):
+    # {bot: [score, games]} and {(a, b): [score of a, games]}
+    total = {}
+    pairs = {}
+    for r in results:
+        a, b = r['bots']
+        sa = 0.5 if r['winner'] is None else 1 - r['winner']
+        for bot, s in ((a, sa), (b, 1 - sa)):
+            total.setdefault(bot, [0, 0])
+            total[bot][0] += s
+            total[bot][1] += 1
+        for x, y, s in ((a, b, sa), (b, a, 1 - sa)):
+            pairs.setdefault((x, y), [0, 0])
+            pairs[(x, y)][0] += s
+            pairs[(x, y)][1] += 1
+    return total, pairs
+
+
+def elo(results, iterations=200):
+    # Bradley-Terry maximum likelihood, on the Elo scale with a mean of 0.
+    # One virtual draw between each pair keeps unbeaten bots finite.
+    bots = sorted({b for r in results for b in r['bots']})
+    _, pairs = scores(results)
+    gamma = {b: 1.0 for b in bots}
+
+    for _ in range(iterations):
+        new = {}
+        for i in bots:
+            won = 0
+            denominator = 0
+            for j in bots:
+                if i != j:
+                    score, n = pairs.get((i, j), (0, 0))
+                    won += score + 0.5
+                    denominator += (n + 1) / (gamma[i] + gamma[j])
+            new[i] = won / denominator
+        mean = sum(log10(g) for g in new.values()) / len(new)
+        gamma = {b: g / 10 ** mean for b, g in new.items()}
+
+    return {b: 400 * log10(g) for b, g in gamma.items()}
+
+
+def elo_intervals(results, samples=200, seed=0):
+    # 95% bootstrap intervals over the games
+    rng = random.Random(seed)
+    draws = {}
+    for _ in range(samples):
+        sample = [rng.choice(results) for _ in results]
+        for bot, rating in elo(sample, 50).items():
+            draws.setdefault(bot, []).append(rating)
+    return {bot: (sorted(r)[int(0.025 * len(r))], sorted(r)[int(0.975 * len(r)) - 1]) for bot, r in draws.items()}
+
+
+def report(results):
+    total, pairs = scores(results)
+    ratings = elo(results)
+    intervals = elo_intervals(results)
+    think = {}
+    for r in results:
+        for bot, times, overtime in zip(r['bots'], r['times'], r['overtime']):
+            t = think.setdefault(bot, [0, 0, 0, 0])
+            t[0] += sum(times)
+            t[1] += len(times)
+            t[2] = max([t[2]] + times)
+            t[3] += overtime
+
+    lines = ['{:<30} {:>7} {:>17} {:>7} {:>15} {:>9} {:>9} {:>6}'.format(
+        'bot', 'elo', '95%', 'score', '95%', 'mean ms', 'max ms', 'late')]
+    for bot in sorted(ratings, key=ratings.get, reverse=True):
+        score, n = total[bot]
+        low, high = wilson(score, n)
+        t = think[bot]
+        lines.append('{:<30} {:>7.0f} {:>8.0f}..{:<7.0f} {:>6.1%} {:>6.1%}..{:<7.1%} {:>9.2f} {:>9.2f} {:>6}'.format(
+            bot, ratings[bot], intervals[bot][0], intervals[bot][1], score / n, low, high,
+            1000 * t[0] / max(1, t[1]), 1000 * t[2], t[3]))
+
+    lines.append('')
+    for (a, b), (score, n) in sorted(pairs.items()):
+        low, high = wilson(score, n)
+        lines.append('{} vs {}: {:.1%} ({:.1%}..{:.1%}) over {} games'.format(a, b, score / n, low, high, n))
+
+    errors = [r for r in results if r['error'] is not None]
+    if errors:
+        lines.append('')
+        lines.append('{} games lost on errors, first: {} {}'.format(len(errors), errors[0]['bots'], errors[0]['error']))
+
+    return '\n'.join(lines)
+
+
+def main(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Play seeded games between bots and rate them.')
+    parser.add_argument('bots', nargs='+', help="bots as module:function")
+    parser.add_argument('--games', type=int, default=100, help="games per pair of bots")
+    parser.add_argument('--workers', type=int, default=None, help="processes, default: one per core")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--turns', type=int, default=MAX_TURNS)
+    parser.add_argument('--time-limit', type=float, default=TIME_LIMIT, help="seconds, only counted")
+    parser.add_argument('--out', help="write every game as a json line")
+    args = parser.parse_args(argv)
+
+    out = open(args.out, 'w') if args.out else None
+    start = perf_counter()
+    results = run(args.bots, args.games, args.workers, args.seed, args.turns, args.time_limit, out)
+    if out is not None:
+        out.close()
+
+    print('{} games in {:.1f}s'.format(len(results), perf_counter() - start))
+    print(report(results))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
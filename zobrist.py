@@ -0,0 +1,134 @@
+from random import Random
+
+from topology import *
+
+# Zobrist keys of the parts of a world. World keeps World.hash up to date with
+# them, see World.ships_hash and the XORs in its update phases.
+# Ship keys depend on the slot of the ship: 0-2 for my ships, 3-5 for the
+# enemies, in list order.
+
+SLOTS = 6
+HEALTH_BUCKET = 1  # healths in the same bucket hash the same, 1 means exact
+HEALTH_BUCKETS = 100 // HEALTH_BUCKET + 1
+COOLDOWNS = 8
+BALL_TURNS = 16
+BARREL_HEALTHS = 32
+
+_rng = Random(1664)
+
+
+def _keys(n):
+    return [_rng.getrandbits(64) for _ in range(n)]
+
+
+POSE_KEYS = _keys(SLOTS * POSES)
+SPEED_KEYS = _keys(SLOTS * 3)
+HEALTH_KEYS = _keys(SLOTS * HEALTH_BUCKETS)
+MINE_COOLDOWN_KEYS = _keys(SLOTS * COOLDOWNS)
+CANON_COOLDOWN_KEYS = _keys(SLOTS * COOLDOWNS)
+MINE_KEYS = _keys(CELLS + 1)
+BARREL_KEYS = _keys((CELLS + 1) * BARREL_HEALTHS)
+BALL_KEYS = _keys((CELLS + 1) * BALL_TURNS)
+
+
+def ship_key(slot, ship):
+    return POSE_KEYS[slot * POSES + 6 * ship.pos + ship.ori] \
+        ^ SPEED_KEYS[slot * 3 + ship.speed] \
+        ^ HEALTH_KEYS[slot * HEALTH_BUCKETS + ship.health // HEALTH_BUCKET] \
+        ^ MINE_COOLDOWN_KEYS[slot * COOLDOWNS + ship.mine_cooldown] \
+        ^ CANON_COOLDOWN_KEYS[slot * COOLDOWNS + ship.canon_cooldown]
+
+
+def barrel_key(barrel):
+    return BARREL_KEYS[barrel.pos * BARREL_HEALTHS + min(barrel.health, BARREL_HEALTHS - 1)]
+
+
+def ball_key(ball):
+    # two balls on the same cell with the same timer cancel out
+    return BALL_KEYS[ball.pos * BALL_TURNS + min(max(ball.remaining_turns, 0), BALL_TURNS - 1)]
+
+
+# Fixed size hash table from World.hash to anything (usually an evaluation).
+# Policies, when a slot is already used by another position:
+#  * 'always': the new entry replaces the old one
+#  * 'depth': it replaces it only if it was searched at least as deep
+#  * 'age': like 'depth', but entries from an older generation (see
+#    new_generation, call it once per real turn) are always replaced
+# get returns None on a miss, so None can't be stored as a value.
+class TranspositionTable:
+    POLICIES = ('always', 'depth', 'age')
+
+    def __init__(self, size=2 ** 16, policy='age'):
+        assert policy in self.POLICIES
+        assert size & (size - 1) == 0, "size must be a power of two"
+
+        self.size = size
+        self.mask = size - 1
+        self.policy = policy
+        self.generation = 0
+
+        self.keys = [None] * size
+        self.depths = [0] * size
+        self.values = [None] * size
+        self.generations = [0] * size
+
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replacements = 0
+        self.rejections = 0
+
+    def __len__(self):
+        return self.size - self.keys.count(None)
+
+    def get(self, key, depth=0):
+        # the value stored for key, if it was searched at least `depth` deep
+        self.probes += 1
+        i = key & self.mask
+        if self.keys[i] == key and self.depths[i] >= depth:
+            self.hits += 1
+            return self.values[i]
+        return None
+
+    def put(self, key, value, depth=0):
+        assert value is not None, "None is what get returns on a miss"
+        i = key & self.mask
+        old = self.keys[i]
+
+        if old is not None and old != key:
+            if self.policy == 'depth' and depth < self.depths[i]:
+                self.rejections += 1
+                return False
+            if self.policy == 'age' and depth < self.depths[i] and self.generations[i] == self.generation:
+                self.rejections += 1
+                return False
+            self.replacements += 1
+
+        self.keys[i] = key
+        self.depths[i] = depth
+        self.values[i] = value
+        self.generations[i] = self.generation
+        self.stores += 1
+        return True
+
+    def new_generation(self):
+        self.generation += 1
+
+    def clear(self):
+        self.__init__(self.size, self.policy)
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'used': len(self),
+            'probes': self.probes,
+            'hits': self.hits,
+            'hit_rate': self.hit_rate,
+            'stores': self.stores,
+            'replacements': self.replacements,
+            'rejections': self.rejections,
+        }